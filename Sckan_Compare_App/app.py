@@ -1,26 +1,85 @@
 
-from shiny import App, render, App, Session, reactive, ui
+import os
+from shiny import App, render, App, Session, reactive, ui, req
 import shinyswatch
 from shinywidgets import output_widget, render_widget
-from sckan_compare import SckanCompare
-from sckan_compare import query
+import plotly.graph_objects as go
+from sckan_compare import SckanCompare, LRUCache, BackgroundLoader
+from sckan_compare import globals
+from sckan_compare import export
+from sckan_compare import snapshot
 import numpy as np
 import pandas as pd
 #
 species_choices = {"Homo sapiens": "Human", "Mus musculus": "Mouse", "Rattus norvegicus": "Rat"}
 viz_choices = {"T": "Table",  "M": "Map", "G": "Graph"}
 columns_to_keep = ["Neuron_Label", "Region_A", "Region_B", "Region_C"]
+# snapshot directory (see `python -m sckan_compare.snapshot`) shared by all workers
+# of a host; if not set, each worker loads and refreshes its own pathway store
+snapshot_dir = os.environ.get("SCKAN_COMPARE_SNAPSHOT")
+# SPARQL endpoint and disk cache directory of the query results, e.g. a local stand-in
+# endpoint for load tests (see benchmarks/load_test.py); defaults to the SCKAN endpoint
+endpoint = os.environ.get("SCKAN_COMPARE_ENDPOINT", globals.BLAZEGRAPH_ENDPOINT)
+cache_dir = os.environ.get("SCKAN_COMPARE_CACHE_DIR")
+# seconds between (delta) refreshes of the pathway data, or checks for a new snapshot
+refresh_interval = 300 if snapshot_dir else 6 * 3600
 #
-sc = SckanCompare()
-result = sc.execute_query(query.neuron_path_all_species_query)
+def load_data():
+    """
+    Create the SckanCompare object with its local pathway store
+    (or memory-mapped snapshot); run in the background.
+    """
+    sc = SckanCompare(endpoint=endpoint, cache_directory=cache_dir)
+    if snapshot_dir:
+        sc.load_snapshot(snapshot_dir)
+    else:
+        sc.refresh_pathway_store()
+    return sc
+
+def refresh_data(sc):
+    """
+    Refresh the pathway store (or load a new snapshot); the new data is swapped in atomically.
+    """
+    if snapshot_dir:
+        # a snapshot may be rewritten with the same version (e.g. after its producer lost its cache)
+        meta = snapshot.read_snapshot_meta(snapshot_dir)
+        if (meta["version"], meta["hash"]) == (sc.get_data_version(), sc.snapshot_hash):
+            return sc
+        return load_data()
+    sc.refresh_pathway_store()
+    return sc
+
+# the app serves (a loading state) immediately; data is loaded in the background
+loader = BackgroundLoader(load_data, refresh=refresh_data, refresh_interval=refresh_interval).start()
+# rendered tables and figure specs, shared by all sessions of this worker
+# (see response_cache.get_stats() for hit rates)
+response_cache = LRUCache()
 #phenotype = sc.execute_query(query.neuron_path_phenotype_all_species_query) 
 #cir = sc.execute_query(query.neuron_circuit_role_all_species_query)
 #
-resultdf = pd.DataFrame(result)
-columns = result[0]
-df = pd.DataFrame(result[1:], columns=columns)
-Region_A_list = {value: value for value in df['Region_A']}
-Region_B_list = {value: value for value in df['Region_B']}
+def get_data_version():
+    """
+    Version of the loaded pathway data (with the content hash of a snapshot), or None while loading.
+    """
+    sc = loader.get_data()
+    if sc is None:
+        return None
+    return sc.get_data_version(), sc.snapshot_hash
+
+def update_region_choices(input_id, choices, current):
+    """
+    Update the choices of a region input, keeping the current region selected
+    if still valid (e.g. when the data is refreshed).
+    """
+    with reactive.isolate():
+        selected = current()
+    ui.update_selectize(input_id, choices=choices, selected=selected if selected in choices else None)
+
+def get_load_state():
+    """
+    Whether the pathway data is loaded, and the error of the last failed load or refresh.
+    """
+    return loader.get_data() is not None, repr(loader.error)
 
 #############################################################################################################################
 
@@ -32,12 +91,13 @@ app_ui = ui.page_fluid(
         ui.panel_sidebar(
             ui.input_select(  "sp1", label="Select target Species", choices= species_choices),
             ui.input_select( "sp2", label="And", choices= species_choices  ),
+            ui.output_text("status"),
             ui.tags.h4("Select target start and end regions for"), ui.output_text_verbatim("species1"),
-            ui.input_selectize("rgst1", "Select Start Region", choices=Region_A_list),
-            ui.input_selectize("rgen1", "Select End Region", choices=Region_B_list),
+            ui.input_selectize("rgst1", "Select Start Region", choices=[]),
+            ui.input_selectize("rgen1", "Select End Region", choices=[]),
             ui.tags.h4("Select target start and end regions for"), ui.output_text_verbatim("species2"),
-            ui.input_selectize("rgst2", "Select Start Region", choices=Region_A_list),
-            ui.input_selectize("rgen2", "Select End Region", choices=Region_B_list),
+            ui.input_selectize("rgst2", "Select Start Region", choices=[]),
+            ui.input_selectize("rgen2", "Select End Region", choices=[]),
             ui.input_radio_buttons("viz_type", "Visualization Option", viz_choices),
         ),
         #main panel
@@ -59,8 +119,122 @@ app_ui = ui.page_fluid(
     ),
 
 )
+def get_selection(df, region_A, region_B):
+    """
+    Rows of a species table for the selected start and end region.
+    """
+    return df[(df.Region_A == region_A) & (df.Region_B == region_B)]
+
+def get_table(req_df, species, region_A, region_B, version):
+    """
+    Table of the selected rows, as displayed.
+    """
+    key = (species, region_A, region_B, "T", version)
+    table = response_cache.get_cached_data(key)
+    if table is None:
+        table = req_df[columns_to_keep]
+        table = table.rename(columns={
+                        'Region_A': 'Start Region',
+                        'Region_C': 'Intermediate Region',
+                        'Region_B': 'End Region',
+                    })
+        response_cache.cache_data(key, table)
+    return table
+
+def get_figure(req_df, species, region_A, region_B, viz_type, version):
+    """
+    Figure of the selected rows for the visualization option.
+    """
+    key = (species, region_A, region_B, viz_type, version)
+    spec = response_cache.get_cached_data(key)
+    if spec is not None:
+        # spec of an already validated figure
+        return go.FigureWidget(spec, _validate=False)
+    sc = loader.get_data()
+    if viz_type == "M":
+        fig = sc.plot_dataframe_anatomy_vis(req_df, species=species)
+    elif viz_type == "G":
+        fig = sc.plot_dataframe_block_vis(req_df, region_A, region_B)
+    else:
+        return None
+    response_cache.cache_data(key, export.get_compact_figure_spec(fig))
+    return fig
+
 def server(input, output, session):
 
+        # version of the loaded data (None while loading); checked every second,
+        # invalidating the outputs once data is loaded or refreshed
+        @reactive.poll(get_data_version, 1)
+        def data_version():
+            return get_data_version()
+
+        # loading state, checked every second on its own (the data version does not
+        # change while loading fails), so that failures and retries are shown
+        @reactive.poll(get_load_state, 1)
+        def load_state():
+            return get_load_state()
+
+        @output
+        @render.text
+        def status():
+            loaded, _ = load_state()
+            if loaded:
+                return ""
+            if loader.error is not None:
+                return "Loading SCKAN data failed, retrying: {}".format(loader.error)
+            return "Loading SCKAN data..."
+
+        # valid start -> end region pairs of each species panel
+        @reactive.Calc
+        def region_pairs1():
+            req(data_version() is not None)
+            return loader.get_data().get_region_pair_index(input.sp1())
+
+        @reactive.Calc
+        def region_pairs2():
+            req(data_version() is not None)
+            return loader.get_data().get_region_pair_index(input.sp2())
+
+        # start regions valid for the species; end regions valid for the start region
+        @reactive.Effect
+        def update_start_regions1():
+            update_region_choices("rgst1", list(region_pairs1()), input.rgst1)
+
+        @reactive.Effect
+        def update_start_regions2():
+            update_region_choices("rgst2", list(region_pairs2()), input.rgst2)
+
+        @reactive.Effect
+        def update_end_regions1():
+            update_region_choices("rgen1", region_pairs1().get(input.rgst1(), []), input.rgen1)
+
+        @reactive.Effect
+        def update_end_regions2():
+            update_region_choices("rgen2", region_pairs2().get(input.rgst2(), []), input.rgen2)
+
+        # data of each species panel, computed once per input change
+        # and shared by its table and figure
+        @reactive.Calc
+        def species_df1():
+            req(data_version() is not None)
+            return loader.get_data().get_species_dataframe(input.sp1())
+
+        @reactive.Calc
+        def species_df2():
+            req(data_version() is not None)
+            return loader.get_data().get_species_dataframe(input.sp2())
+
+        # only valid pairs are rendered (e.g. not while the choices are being updated)
+        @reactive.Calc
+        def selection1():
+            req(input.rgen1() in region_pairs1().get(input.rgst1(), []))
+            return get_selection(species_df1(), input.rgst1(), input.rgen1())
+
+        @reactive.Calc
+        def selection2():
+            req(input.rgen2() in region_pairs2().get(input.rgst2(), []))
+            return get_selection(species_df2(), input.rgst2(), input.rgen2())
+
         @output
         @render.text
         def species1():
@@ -74,80 +248,30 @@ def server(input, output, session):
         @output
         @render.table
         def Table1():
-            input_regionA_sp1 = input.rgst1()
-            input_regionB_sp1 = input.rgen1()
-            result_df = sc.get_filtered_dataframe(result, species=input.sp1())
-            #hasNeuronalPhenotype = sc.get_filtered_dataframe(phenotype, species=input.sp1()) 
-            #regions_specie1 = regions[regions['Specie']==input.sp1()] # filter specie
-            if input.viz_type() == "T":                
-                final_plus_pheno = result_df[(result_df.Region_A == input_regionA_sp1) & (result_df.Region_B == input_regionB_sp1)]
-                final_plus_pheno =final_plus_pheno[columns_to_keep]
-                final_plus_pheno =final_plus_pheno.rename(columns={
-                                'Region_A': 'Start Region',
-                                'Region_C': 'Intermediate Region',
-                                'Region_B': 'End Region',
-                            })
-                final_plus_pheno
-            else:
-                final_plus_pheno = None
-            return final_plus_pheno
+            if input.viz_type() != "T":
+                return None
+            return get_table(selection1(), input.sp1(), input.rgst1(), input.rgen1(), data_version())
         
         @output
         @render.table
         def Table2():
-            input_regionA_sp2 = input.rgst2()
-            input_regionB_sp2 = input.rgen2()
-            result_df1 = sc.get_filtered_dataframe(result, species=input.sp2())
-            #hasNeuronalPhenotype = sc.get_filtered_dataframe(phenotype, species=input.sp2()) 
-            #regions_specie2 = regions[regions['Specie']==input.sp2()] # filter specie
-            if input.viz_type() == "T":                
-                final_plus_pheno2 = result_df1[(result_df1.Region_A == input_regionA_sp2) & (result_df1.Region_B == input_regionB_sp2)]
-                final_plus_pheno2 =final_plus_pheno2[columns_to_keep]
-                final_plus_pheno2 =final_plus_pheno2.rename(columns={
-                                'Region_A': 'Start Region',
-                                'Region_C': 'Intermediate Region',
-                                'Region_B': 'End Region',
-                            })
-                final_plus_pheno2
-            else:
-                final_plus_pheno2 = None
-            return final_plus_pheno2
+            if input.viz_type() != "T":
+                return None
+            return get_table(selection2(), input.sp2(), input.rgst2(), input.rgen2(), data_version())
         
         @output
         @render_widget
         def map1():
-            selected_Region_A = input.rgst1()
-            selected_Region_B = input.rgen1()
-            result_df = sc.get_filtered_dataframe(result, species=input.sp1())
-            #hasCircuitRole= sc.get_filtered_dataframe(cir, species=input_sp1)  
-            if input.viz_type() == "M":
-                req_df = result_df[(result_df.Region_A == selected_Region_A) & (result_df.Region_B == selected_Region_B)]
-                fig = sc.plot_dataframe_anatomy_vis(req_df, species=input.sp1())
-            elif input.viz_type() == "G":
-                fig = sc.plot_dataframe_block_vis(result_df, selected_Region_A, selected_Region_B)  
-            else:
-                fig = None
-            return fig    
-
-           
+            if input.viz_type() not in ("M", "G"):
+                return None
+            return get_figure(selection1(), input.sp1(), input.rgst1(), input.rgen1(), input.viz_type(), data_version())
+
         @output
         @render_widget
         def map2():
-            selected_Region_A = input.rgst2()
-            selected_Region_B = input.rgen2()
-            result_df2 = sc.get_filtered_dataframe(result, species=input.sp2())
-            if input.viz_type() == "M":
-                req_df2 = result_df2[(result_df2.Region_A == selected_Region_A) & (result_df2.Region_B == selected_Region_B)]
-                fig = sc.plot_dataframe_anatomy_vis(req_df2, species=input.sp2())
-            elif input.viz_type() == "G":
-                fig = sc.plot_dataframe_block_vis(result_df2, selected_Region_A, selected_Region_B)     
-            else:
-                fig = None
-            return fig
-
-
-               
-
+            if input.viz_type() not in ("M", "G"):
+                return None
+            return get_figure(selection2(), input.sp2(), input.rgst2(), input.rgen2(), input.viz_type(), data_version())
 
 
 app = App(app_ui, server)
@@ -0,0 +1,561 @@
+"""
+Load test of the SckanCompare web app (Sckan_Compare_App/app.py).
+
+Launches one or more app workers against a local stand-in SPARQL endpoint
+with synthetic data (see `sckan_compare.synthetic`), and simulates concurrent
+sessions over the Shiny websocket protocol: each session repeatedly switches
+the species, start/end regions or visualization type of a panel, waiting a
+random think time between actions. The latency of an action is the time
+from sending the input update until all outputs were recomputed and sent.
+
+The test runs in stages of increasing numbers of sessions, reporting per
+stage the latency percentiles and throughput of the actions, and the CPU
+and memory use of each worker (read from /proc, i.e. on Linux only). The
+stages give a capacity model of a worker, e.g. the number of sessions at
+which the 95th percentile latency exceeds a target.
+
+Usage (from the repository root; requires the app dependencies, e.g. shiny)::
+
+    python benchmarks/load_test.py --sessions 1 5 10 20 --duration 60 --output load.json
+
+License: Apache License 2.0
+"""
+
+import os
+import sys
+import json
+import time
+import re
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+# test the package and app of this working tree, rather than installed ones
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+import numpy as np
+import websockets
+
+from sckan_compare import SckanCompare, synthetic
+
+APP_PATH = os.path.join(ROOT_DIRECTORY, "Sckan_Compare_App", "app.py")
+
+# choices of the app inputs
+SPECIES = ["Homo sapiens", "Mus musculus", "Rattus norvegicus"]
+VIZ_TYPES = ["T", "M", "G"]
+
+# number of neurons at scale 1
+NEURONS_PER_SCALE = 200
+
+# latency percentiles reported
+PERCENTILES = [50, 90, 95, 99]
+
+
+class ProcessSampler(object):
+    """
+    A class sampling the CPU time and resident memory of processes in a background thread.
+
+    Parameters
+    ----------
+    pids : list
+        Process IDs of the workers.
+    interval : float, optional
+        Seconds between samples. Defaults to 0.5.
+
+    Attributes
+    ----------
+    samples : dict
+        Dict with process IDs as keys and lists of (time, CPU seconds, RSS bytes) tuples as values.
+
+    Methods
+    -------
+    __init__(pids, interval=0.5):
+        Initialize the ProcessSampler class.
+    start():
+        Start sampling.
+    stop():
+        Stop sampling.
+    get_stats(start, end):
+        Get the CPU and memory use of each process between two times.
+    """
+
+    def __init__(self, pids, interval=0.5):
+        """
+        Initialize ProcessSampler object.
+
+        Parameters
+        ----------
+        pids : list
+            Process IDs of the workers.
+        interval : float, optional
+            Seconds between samples.
+        """
+        self.pids = list(pids)
+        self.interval = interval
+        self.samples = {pid: [] for pid in self.pids}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="load-test-sampler", daemon=True)
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    @staticmethod
+    def read_process(pid):
+        """
+        Read the CPU time (s) and resident memory (bytes) of a process from /proc.
+
+        Returns
+        -------
+        tuple or None
+            (CPU seconds, RSS bytes), or None if not available.
+        """
+        try:
+            with open("/proc/{}/stat".format(pid)) as stat_file:
+                # fields after the command name, which may contain spaces
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+            with open("/proc/{}/statm".format(pid)) as statm_file:
+                rss_pages = int(statm_file.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        return cpu_seconds, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+    def _run(self):
+        """
+        Sample all processes until stopped.
+        """
+        while not self._stopped.is_set():
+            now = time.perf_counter()
+            for pid in self.pids:
+                sample = self.read_process(pid)
+                if sample is not None:
+                    self.samples[pid].append((now,) + sample)
+            self._stopped.wait(self.interval)
+
+    def get_stats(self, start, end):
+        """
+        Get the CPU and memory use of each process between two times.
+
+        Parameters
+        ----------
+        start : float
+            Start time (time.perf_counter).
+        end : float
+            End time (time.perf_counter).
+
+        Returns
+        -------
+        list
+            One dict per process with the mean and maximum CPU use (% of one
+            core) and the mean and maximum RSS (MB); values are None without samples.
+        """
+        stats = []
+        for pid in self.pids:
+            samples = np.array([sample for sample in self.samples[pid] if start <= sample[0] <= end])
+            stat = {"pid": pid, "cpu_mean_percent": None, "cpu_max_percent": None,
+                    "rss_mean_mb": None, "rss_max_mb": None}
+            if len(samples) >= 2:
+                cpu = np.diff(samples[:, 1]) / np.diff(samples[:, 0]) * 100
+                total_cpu = (samples[-1, 1] - samples[0, 1]) / (samples[-1, 0] - samples[0, 0]) * 100
+                stat.update(cpu_mean_percent=float(total_cpu), cpu_max_percent=float(cpu.max()),
+                            rss_mean_mb=float(samples[:, 2].mean() / 2**20),
+                            rss_max_mb=float(samples[:, 2].max() / 2**20))
+            stats.append(stat)
+        return stats
+
+
+def get_free_port():
+    """
+    Get a free local TCP port.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_worker(app_path, port, endpoint, cache_directory, log_directory):
+    """
+    Start an app worker process.
+
+    Parameters
+    ----------
+    app_path : str
+        Path of the app.
+    port : int
+        Port of the worker.
+    endpoint : str
+        SPARQL endpoint URL of the app.
+    cache_directory : str
+        Disk cache directory of the app.
+    log_directory : str
+        Directory of the log file of the worker.
+
+    Returns
+    -------
+    subprocess.Popen
+        The worker process.
+    """
+    env = dict(os.environ)
+    env["SCKAN_COMPARE_ENDPOINT"] = endpoint
+    env["SCKAN_COMPARE_CACHE_DIR"] = cache_directory
+    env["PYTHONPATH"] = os.pathsep.join([ROOT_DIRECTORY] + [path for path in [env.get("PYTHONPATH")] if path])
+    log_file = open(os.path.join(log_directory, "worker_{}.log".format(port)), "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "shiny", "run", "--host", "127.0.0.1", "--port", str(port), app_path],
+        env=env, stdout=log_file, stderr=subprocess.STDOUT, cwd=os.path.dirname(app_path))
+
+
+def wait_for_http(url, process, timeout):
+    """
+    Wait until a URL of a worker process can be retrieved, and return its content.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return response.read().decode("utf-8")
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("App worker exited with status {}!".format(process.returncode))
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def get_output_ids(page):
+    """
+    Get the IDs of the outputs of the app page.
+    """
+    ids = []
+    for tag in re.findall(r"<\w+\s[^>]*\bclass=\"[^\"]*\bshiny-[\w-]*output\b[^>]*>", page):
+        match = re.search(r"\bid=\"([^\"]+)\"", tag)
+        if match:
+            ids.append(match.group(1))
+    return ids
+
+
+def get_initial_inputs(state, url, output_ids):
+    """
+    Get the inputs of the init message of a session.
+
+    As sent by a browser, the client data includes the visibility of each
+    output; hidden outputs are not computed.
+    """
+    inputs = dict(state)
+    for output_id in output_ids:
+        inputs[".clientdata_output_{}_hidden".format(output_id)] = False
+        inputs[".clientdata_output_{}_width".format(output_id)] = 800
+        inputs[".clientdata_output_{}_height".format(output_id)] = 400
+    inputs.update({
+        ".clientdata_url_protocol": "http:",
+        ".clientdata_url_hostname": "127.0.0.1",
+        ".clientdata_url_port": url.rsplit(":", 1)[1].split("/")[0],
+        ".clientdata_url_pathname": "/",
+        ".clientdata_url_search": "",
+        ".clientdata_url_hash_initial": "",
+        ".clientdata_url_hash": "",
+        ".clientdata_pixelratio": 1,
+        ".clientdata_singletons": "",
+        ".clientdata_allowDataUriScheme": True,
+    })
+    return inputs
+
+
+async def wait_for_outputs(connection, timeout):
+    """
+    Receive messages until the outputs of an update are sent.
+
+    The server signals busy/idle while outputs are recomputed, and sends
+    the output values at the end of each flush. Flushes without any values
+    (e.g. of the app polling its data version) are skipped.
+
+    Returns
+    -------
+    dict
+        The output values and errors of the flush.
+    """
+    busy = False
+    values = {"values": {}, "errors": {}}
+    while True:
+        message = json.loads(await asyncio.wait_for(connection.recv(), timeout))
+        if "busy" in message:
+            busy = message["busy"] == "busy"
+        if "values" in message:
+            values["values"].update(message.get("values") or {})
+            values["errors"].update(message.get("errors") or {})
+            if not busy and (values["values"] or values["errors"]):
+                return values
+
+
+async def wait_until_ready(url, output_ids, timeout):
+    """
+    Wait until a worker has loaded its data, i.e. its status output is empty.
+    """
+    state = {"sp1": SPECIES[0], "sp2": SPECIES[0], "rgst1": "", "rgen1": "",
+             "rgst2": "", "rgen2": "", "viz_type": "T"}
+    deadline = time.time() + timeout
+    async with websockets.connect(url, max_size=None) as connection:
+        await connection.send(json.dumps({"method": "init", "data": get_initial_inputs(state, url, output_ids)}))
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError("App worker did not load its data in time!")
+            message = json.loads(await asyncio.wait_for(connection.recv(), remaining))
+            if (message.get("values") or {}).get("status") == "":
+                return
+
+
+def get_random_pair(region_pairs, species, rng):
+    """
+    Get a random valid (start, end) region pair of a species.
+    """
+    region_A = rng.choice(sorted(region_pairs[species]))
+    return region_A, rng.choice(region_pairs[species][region_A])
+
+
+def get_next_action(state, region_pairs, rng):
+    """
+    Get a random action of a session, as the name of the action and the inputs to update.
+    """
+    panel = rng.choice(["1", "2"])
+    action = rng.choice(["species", "regions", "viz_type"])
+    if action == "species":
+        species = rng.choice([name for name in region_pairs if name != state["sp" + panel]] or list(region_pairs))
+        region_A, region_B = get_random_pair(region_pairs, species, rng)
+        return action, {"sp" + panel: species, "rgst" + panel: region_A, "rgen" + panel: region_B}
+    if action == "regions":
+        region_A, region_B = get_random_pair(region_pairs, state["sp" + panel], rng)
+        return action, {"rgst" + panel: region_A, "rgen" + panel: region_B}
+    return action, {"viz_type": rng.choice([name for name in VIZ_TYPES if name != state["viz_type"]])}
+
+
+async def run_session(url, output_ids, worker, region_pairs, start_delay, end_time, think_time, timeout, rng,
+                      records):
+    """
+    Simulate a session: connect, then perform random actions until the end time.
+
+    Each action is recorded as a dict with the action name, worker index,
+    start time, latency (s) and whether it succeeded.
+    """
+    await asyncio.sleep(start_delay)
+    species1, species2 = rng.choice(list(region_pairs)), rng.choice(list(region_pairs))
+    (rgst1, rgen1), (rgst2, rgen2) = get_random_pair(region_pairs, species1, rng), get_random_pair(region_pairs, species2, rng)
+    state = {"sp1": species1, "sp2": species2, "rgst1": rgst1, "rgen1": rgen1,
+             "rgst2": rgst2, "rgen2": rgen2, "viz_type": rng.choice(VIZ_TYPES)}
+
+    async def perform(action, message):
+        start = time.perf_counter()
+        try:
+            await connection.send(json.dumps(message))
+            result = await wait_for_outputs(connection, timeout)
+            ok = not result["errors"]
+        except (asyncio.TimeoutError, websockets.ConnectionClosed):
+            ok = False
+        records.append({"action": action, "worker": worker, "start": start,
+                        "latency": time.perf_counter() - start, "ok": ok})
+        return ok
+
+    try:
+        async with websockets.connect(url, max_size=None) as connection:
+            if not await perform("init", {"method": "init", "data": get_initial_inputs(state, url, output_ids)}):
+                return
+            while True:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * think_time)
+                if time.perf_counter() >= end_time:
+                    return
+                action, update = get_next_action(state, region_pairs, rng)
+                state.update(update)
+                if not await perform(action, {"method": "update", "data": update}):
+                    return
+    except (OSError, websockets.WebSocketException):
+        records.append({"action": "connect", "worker": worker, "start": time.perf_counter(),
+                        "latency": 0.0, "ok": False})
+
+
+def summarize(records, duration):
+    """
+    Summarize the actions of a stage.
+
+    Parameters
+    ----------
+    records : list
+        The recorded actions.
+    duration : float
+        Duration of the stage (s).
+
+    Returns
+    -------
+    dict
+        Dict with action names (and 'all') as keys, and dicts with the
+        count, errors, throughput (actions/s) and latency percentiles (ms) as values.
+    """
+    summary = {}
+    actions = sorted({record["action"] for record in records})
+    for action in ["all"] + actions:
+        selected = [record for record in records if action == "all" or record["action"] == action]
+        latencies = np.array([record["latency"] for record in selected if record["ok"]]) * 1000
+        stats = {
+            "count": len(selected),
+            "errors": sum(not record["ok"] for record in selected),
+            "throughput": len(selected) / duration,
+        }
+        for percentile in PERCENTILES:
+            stats["p{}_ms".format(percentile)] = float(np.percentile(latencies, percentile)) if latencies.size else None
+        stats["max_ms"] = float(latencies.max()) if latencies.size else None
+        summary[action] = stats
+    return summary
+
+
+async def run_stage(urls, output_ids, num_sessions, duration, ramp_up, think_time, timeout, region_pairs, seed):
+    """
+    Run a stage of the load test with a number of concurrent sessions.
+
+    Sessions are spread over the workers round robin, and started evenly over
+    the ramp up time; only the actions after the ramp up are summarized.
+
+    Returns
+    -------
+    tuple
+        The recorded actions, and the start and end time of the measured period.
+    """
+    records = []
+    start = time.perf_counter()
+    end_time = start + ramp_up + duration
+    sessions = []
+    for idx in range(num_sessions):
+        worker = idx % len(urls)
+        sessions.append(run_session(urls[worker], output_ids, worker, region_pairs, ramp_up * idx / num_sessions,
+                                    end_time, think_time, timeout, random.Random(seed * 100003 + idx), records))
+    await asyncio.gather(*sessions)
+    measured = [record for record in records
+                if record["action"] != "init" and record["start"] >= start + ramp_up]
+    return measured, start + ramp_up, end_time
+
+
+def format_value(value, fmt):
+    """
+    Format a value of the report; '-' if not available.
+    """
+    return "-" if value is None else fmt.format(value)
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Load test of the SckanCompare web app.")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 5, 10],
+                        help="numbers of concurrent sessions of the stages (default: 1 5 10)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds measured per stage (default: 60)")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds to start the sessions of a stage (default: 5)")
+    parser.add_argument("--think-time", type=float, default=2, help="mean seconds between actions of a session (default: 2)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds until an action fails (default: 60)")
+    parser.add_argument("--workers", type=int, default=1, help="number of app worker processes (default: 1)")
+    parser.add_argument("--scale", type=int, default=1, help="scale of the synthetic data; 1 is 200 neurons (default: 1)")
+    parser.add_argument("--endpoint", default=None, help="SPARQL endpoint URL instead of synthetic data")
+    parser.add_argument("--app", default=APP_PATH, help="path of the app (default: Sckan_Compare_App/app.py)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data and sessions (default: 0)")
+    parser.add_argument("--output", default=None, help="JSON file to write the report to")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        data = synthetic.SyntheticSckan(num_neurons=NEURONS_PER_SCALE * args.scale, seed=args.seed)
+        server, endpoint = synthetic.serve(data)
+    cache_directory = tempfile.mkdtemp(prefix="sckan_compare_load_test_")
+    workers = []
+    completed = False
+    try:
+        # valid region pairs, computed as by the app (also filling the cache shared with the workers)
+        sc = SckanCompare(endpoint=endpoint, cache_directory=os.path.join(cache_directory, "cache"))
+        sc.refresh_pathway_store()
+        region_pairs = {species: sc.get_region_pair_index(species) for species in SPECIES}
+        region_pairs = {species: pairs for species, pairs in region_pairs.items() if pairs}
+        if not region_pairs:
+            raise ValueError("No valid region pairs in the data!")
+        sc.cache_manager.cache.close()
+
+        ports = [get_free_port() for _ in range(args.workers)]
+        workers = [start_worker(args.app, port, endpoint, os.path.join(cache_directory, "cache"), cache_directory)
+                   for port in ports]
+        for port, worker in zip(ports, workers):
+            page = wait_for_http("http://127.0.0.1:{}/".format(port), worker, timeout=120)
+        output_ids = get_output_ids(page)
+        urls = ["ws://127.0.0.1:{}/websocket/".format(port) for port in ports]
+        for url in urls:
+            asyncio.run(wait_until_ready(url, output_ids, timeout=600))
+        print("{} worker(s) ready".format(len(workers)))
+
+        sampler = ProcessSampler([worker.pid for worker in workers])
+        sampler.start()
+        stages = []
+        for num_sessions in args.sessions:
+            records, start, end = asyncio.run(run_stage(
+                urls, output_ids, num_sessions, args.duration, args.ramp_up, args.think_time, args.timeout,
+                region_pairs, args.seed))
+            stage = {
+                "sessions": num_sessions,
+                "actions": summarize(records, args.duration),
+                "workers": sampler.get_stats(start, end),
+            }
+            stages.append(stage)
+            overall = stage["actions"]["all"]
+            print("sessions {:<5} actions {:<6} errors {:<4} throughput {:7.2f}/s   "
+                  "p50 {} ms   p95 {} ms   p99 {} ms".format(
+                      num_sessions, overall["count"], overall["errors"], overall["throughput"],
+                      format_value(overall["p50_ms"], "{:.0f}"), format_value(overall["p95_ms"], "{:.0f}"),
+                      format_value(overall["p99_ms"], "{:.0f}")))
+            for idx, worker in enumerate(stage["workers"]):
+                print("    worker {}: CPU mean {} %, max {} %; RSS mean {} MB, max {} MB".format(
+                    idx, format_value(worker["cpu_mean_percent"], "{:.0f}"),
+                    format_value(worker["cpu_max_percent"], "{:.0f}"),
+                    format_value(worker["rss_mean_mb"], "{:.0f}"), format_value(worker["rss_max_mb"], "{:.0f}")))
+        sampler.stop()
+
+        if args.output:
+            report = {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "settings": {key: value for key, value in vars(args).items() if key != "output"},
+                "stages": stages,
+            }
+            with open(args.output, "w", encoding="utf-8") as json_file:
+                json.dump(report, json_file, indent=2)
+        completed = True
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        # the worker logs are kept if the test failed
+        if completed:
+            shutil.rmtree(cache_directory, ignore_errors=True)
+        else:
+            print("Worker logs in {}".format(cache_directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmarks of the query, normalization and rendering hot paths of SckanCompare package.
+
+The benchmarks run on synthetic data (see `sckan_compare.synthetic`) at one or
+more scales; scale 1 has 200 neurons, about the size of SCKAN today. Query
+results are served as CSV by a local HTTP endpoint, so that `sparql_query`
+is timed including the transfer and parsing of the response.
+
+Each benchmark is timed over a number of repeats, and its memory use is
+measured with tracemalloc in a separate run: the peak of the allocations
+during the run, and the allocations retained by its result.
+
+Usage (from the repository root; the working tree is benchmarked)::
+
+    python benchmarks/run_benchmarks.py run --scales 1 10 --output base.json
+    ... make changes ...
+    python benchmarks/run_benchmarks.py run --scales 1 10 --output new.json
+    python benchmarks/run_benchmarks.py compare base.json new.json
+
+`compare` exits with status 1 if any benchmark regressed by more than the
+thresholds, so that it can be used as a release check.
+
+License: Apache License 2.0
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+# benchmark the package of this working tree, rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from sckan_compare import SckanCompare, query, utils, export, gallery, synthetic
+from sckan_compare.anatomyvis import AntomyVis
+from sckan_compare.blockvis import BlockVis
+
+# version of the results format
+RESULTS_FORMAT = 1
+
+# number of neurons at scale 1
+NEURONS_PER_SCALE = 200
+
+# species of the normalization and rendering benchmarks
+BENCHMARK_SPECIES = "Homo sapiens"
+
+
+def get_benchmarks(sc, endpoint):
+    """
+    Prepare the inputs of the benchmarks, and get the benchmarks.
+
+    Parameters
+    ----------
+    sc : SckanCompare
+        SckanCompare object using the endpoint, with an empty disk cache.
+    endpoint : str
+        The endpoint URL.
+
+    Returns
+    -------
+    list
+        List of (name, number of input rows, function without arguments) tuples.
+    """
+    rows = query.sparql_query(query.neuron_path_all_species_query, endpoint=endpoint)
+    cache_key = query.neuron_path_all_species_query + endpoint
+    sc.cache_manager.cache_data(cache_key, rows)
+
+    df = sc.get_filtered_dataframe(rows, species=BENCHMARK_SPECIES)
+    df_species = df[df.Species == BENCHMARK_SPECIES].dropna()
+    pairs = gallery.get_region_pairs(df_species)
+    region_A, region_B = pairs.loc[0, "Region_A"], pairs.loc[0, "Region_B"]
+
+    def plot_anatomy():
+        vis = AntomyVis(species=BENCHMARK_SPECIES, widget=False)
+        vis.plot_dataframe(df_species)
+        return vis.fig
+
+    def plot_block():
+        vis = BlockVis(widget=False)
+        vis.plot_figure(df_species, region_A, region_B)
+        return vis.fig
+
+    fig = plot_anatomy()
+    num_rows = len(rows) - 1
+    return [
+        ("sparql_query", num_rows,
+         lambda: query.sparql_query(query.neuron_path_all_species_query, endpoint=endpoint)),
+        ("cache_set", num_rows, lambda: sc.cache_manager.cache_data(cache_key, rows)),
+        ("cache_get", num_rows, lambda: sc.cache_manager.get_cached_data(cache_key)),
+        ("get_dataframe", num_rows, lambda: utils.get_dataframe(rows, categorical=True, intern_table={})),
+        ("get_filtered_dataframe", num_rows, lambda: sc.get_filtered_dataframe(rows, species=BENCHMARK_SPECIES)),
+        ("anatomy_plot", df_species.shape[0], plot_anatomy),
+        ("block_plot", df_species.shape[0], plot_block),
+        ("figure_to_json", df_species.shape[0], lambda: fig.to_json()),
+        ("figure_to_compact_json", df_species.shape[0], lambda: export.to_compact_json(fig)),
+    ]
+
+
+def measure(function, repeat):
+    """
+    Time a function, and measure its memory use.
+
+    Parameters
+    ----------
+    function : callable
+        Function without arguments.
+    repeat : int
+        Number of timed runs.
+
+    Returns
+    -------
+    dict
+        The minimum and median time (s), and the peak and retained memory (MB).
+    """
+    # warm up (e.g. module level caches), not timed
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_mb": (peak - before) / 2**20,
+        "retained_mb": max(retained - before, 0) / 2**20,
+    }
+
+
+def get_environment():
+    """
+    Get a description of the environment of a benchmark run.
+
+    Returns
+    -------
+    dict
+        Versions of Python and the main dependencies, platform and git commit.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "commit": commit,
+    }
+
+
+def run(scales, repeat=5, names=None, seed=0):
+    """
+    Run the benchmarks at several scales.
+
+    Parameters
+    ----------
+    scales : list
+        Scales of the synthetic data (1 is about the size of SCKAN today).
+    repeat : int, optional
+        Number of timed runs of each benchmark. Defaults to 5.
+    names : list, optional
+        Names of the benchmarks to run. Defaults to all.
+    seed : int, optional
+        Seed of the synthetic data. Defaults to 0.
+
+    Returns
+    -------
+    dict
+        The results, with keys 'format', 'created', 'environment', 'settings' and 'results'.
+    """
+    results = []
+    for scale in scales:
+        data = synthetic.SyntheticSckan(num_neurons=NEURONS_PER_SCALE * scale, seed=seed)
+        server, endpoint = synthetic.serve(data)
+        cache_directory = tempfile.mkdtemp(prefix="sckan_compare_benchmark_")
+        try:
+            sc = SckanCompare(endpoint=endpoint, cache_directory=cache_directory)
+            for name, num_rows, function in get_benchmarks(sc, endpoint):
+                if names and name not in names:
+                    continue
+                result = {"name": name, "scale": scale, "rows": num_rows}
+                result.update(measure(function, repeat))
+                print("{name:<24} scale {scale:<5} rows {rows:<9} median {median_s:9.4f} s   "
+                      "peak {peak_mb:8.1f} MB   retained {retained_mb:8.1f} MB".format(**result))
+                results.append(result)
+            sc.cache_manager.cache.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(cache_directory, ignore_errors=True)
+
+    return {
+        "format": RESULTS_FORMAT,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": get_environment(),
+        "settings": {"scales": scales, "repeat": repeat, "seed": seed},
+        "results": results,
+    }
+
+
+def compare(base, new, threshold=0.25, memory_threshold=0.25, min_seconds=0.002, min_mb=0.5):
+    """
+    Compare the results of two benchmark runs.
+
+    Small absolute differences (below min_seconds and min_mb) are never
+    considered regressions, as they are mostly noise.
+
+    Parameters
+    ----------
+    base : dict
+        The reference results.
+    new : dict
+        The results to check.
+    threshold : float, optional
+        Maximum relative increase of the median time. Defaults to 0.25.
+    memory_threshold : float, optional
+        Maximum relative increase of the peak memory. Defaults to 0.25.
+    min_seconds : float, optional
+        Minimum absolute increase of the median time of a regression. Defaults to 0.002.
+    min_mb : float, optional
+        Minimum absolute increase of the peak memory of a regression. Defaults to 0.5.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per benchmark and scale in both runs, with the time and
+        memory ratios (new / base) and a column 'regression'.
+    """
+    for results in (base, new):
+        if results.get("format") != RESULTS_FORMAT:
+            raise ValueError("Unsupported results format: {}!".format(results.get("format")))
+    columns = ["name", "scale", "median_s", "peak_mb"]
+    df = pd.DataFrame(base["results"])[columns].merge(
+        pd.DataFrame(new["results"])[columns], on=["name", "scale"], suffixes=("_base", "_new"))
+    df["time_ratio"] = df["median_s_new"] / df["median_s_base"]
+    df["memory_ratio"] = df["peak_mb_new"] / df["peak_mb_base"].where(df["peak_mb_base"] > 0)
+    slower = ((df["median_s_new"] > df["median_s_base"] * (1 + threshold))
+              & (df["median_s_new"] - df["median_s_base"] > min_seconds))
+    larger = ((df["peak_mb_new"] > df["peak_mb_base"] * (1 + memory_threshold))
+              & (df["peak_mb_new"] - df["peak_mb_base"] > min_mb))
+    df["regression"] = slower | larger
+    return df
+
+
+def main():
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the SckanCompare hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--scales", nargs="+", type=int, default=[1, 10],
+                            help="scales of the synthetic data (default: 1 10)")
+    run_parser.add_argument("--repeat", type=int, default=5, help="number of timed runs (default: 5)")
+    run_parser.add_argument("--benchmarks", nargs="+", default=None, help="benchmarks to run (default: all)")
+    run_parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data (default: 0)")
+    run_parser.add_argument("--output", default=None, help="JSON file to write the results to")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two runs; exit status 1 on regressions")
+    compare_parser.add_argument("base", help="JSON file with the reference results")
+    compare_parser.add_argument("new", help="JSON file with the results to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.25,
+                                help="maximum relative increase of the median time (default: 0.25)")
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.25,
+                                help="maximum relative increase of the peak memory (default: 0.25)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run(args.scales, repeat=args.repeat, names=args.benchmarks, seed=args.seed)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as json_file:
+                json.dump(results, json_file, indent=2)
+        return 0
+
+    with open(args.base, encoding="utf-8") as json_file:
+        base = json.load(json_file)
+    with open(args.new, encoding="utf-8") as json_file:
+        new = json.load(json_file)
+    df = compare(base, new, threshold=args.threshold, memory_threshold=args.memory_threshold)
+    with pd.option_context("display.width", 200, "display.max_rows", None):
+        print(df.round(4).to_string(index=False))
+    regressions = df[df["regression"]]
+    if not regressions.empty:
+        print("\n{} regression(s): {}".format(regressions.shape[0], ", ".join(
+            "{} (scale {})".format(name, scale) for name, scale in zip(regressions["name"], regressions["scale"]))))
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,11 +10,21 @@ import os
 import json
 import time
 import pkg_resources
+import pandas as pd
 
 from . import globals
 from . import query
 from . import utils
-from .cachemanager import CacheManager
+from . import tracing
+from . import batch
+from . import coordmap
+from . import gallery
+from . import snapshot
+from . import memprofile
+from .cachemanager import CacheManager, LRUCache
+from .pathwaystore import PathwayStore, get_fingerprints
+from .chains import ConnectionGraph
+from .loader import BackgroundLoader
 from .anatomyvis import AntomyVis
 from .blockvis import BlockVis
 
@@ -24,7 +34,8 @@ class SckanCompare(object):
     Base class for accessing functionality
     """
 
-    def __init__(self, endpoint=globals.BLAZEGRAPH_ENDPOINT, max_cache_days=globals.DEFAULT_MAX_CACHE_DAYS):
+    def __init__(self, endpoint=globals.BLAZEGRAPH_ENDPOINT, max_cache_days=globals.DEFAULT_MAX_CACHE_DAYS,
+                 cache_directory=None):
         """
         Initialize SckanCompare object.
 
@@ -34,14 +45,36 @@ class SckanCompare(object):
             The Blazegraph endpoint URL. Defaults to globals.BLAZEGRAPH_ENDPOINT (https://blazegraph.scicrunch.io/blazegraph/sparql).
         max_cache_days : int, optional
             Maximum number of days to keep cached data. Defaults to globals.DEFAULT_MAX_CACHE_DAYS (7 days).
+        cache_directory : str, optional
+            Directory of the disk cache of query results. Defaults to 'api_cache' in the package directory.
         """
         self.endpoint = endpoint
 
-        self.cache_manager = CacheManager(os.path.join(
-            os.path.dirname(__file__), 'api_cache'), max_cache_days)
+        # shared instances of all strings (e.g. IRIs) in query results held by this object
+        self.intern_table = {}
+
+        if cache_directory is None:
+            cache_directory = os.path.join(os.path.dirname(__file__), 'api_cache')
+        self.cache_manager = CacheManager(cache_directory, max_cache_days)
         
         self.valid_species_list = self.get_valid_species().values()
 
+        # local store of the pathway data; see refresh_pathway_store()
+        self.pathway_store = None
+
+        # normalized pathway tables by species, as (store version, DataFrame); see get_species_dataframe()
+        self.species_tables = {}
+
+        # version and content hash of the tables loaded from a snapshot, if any; see load_snapshot()
+        self.snapshot_version = None
+        self.snapshot_hash = None
+
+        # valid start and end region pairs by species, as (store version, dict); see get_region_pair_index()
+        self.region_pair_indexes = {}
+
+        # memory profiler of the processing stages, if enabled; see enable_memory_profiling()
+        self.memory_profiler = None
+
     def get_valid_species(self):
         """
         Retrieve a list of valid species from the data source.
@@ -129,13 +162,7 @@ class SckanCompare(object):
         
         # mapping of region labels to URIs done based on stored JSON files for each species
         # TODO: currently works only for species with available JSON maps
-        datapath = pkg_resources.resource_filename("sckan_compare", "data")
-        filepath = os.path.join(datapath, globals.AVAILABLE_SPECIES_MAPS[species])
-        with open(filepath, encoding='utf-8-sig') as json_file:
-            data = json.load(json_file)
-        region_map = {}
-        for item in data:
-            region_map[item["URL"]] = item["Name"]
+        region_map = coordmap.get_coordinate_map(species).get_region_labels()
 
         temp_dict = {}
         for item in temp_regions[1:]:
@@ -148,7 +175,7 @@ class SckanCompare(object):
 
         return temp_dict
 
-    def execute_query(self, query_string, species=None, cached=True):
+    def execute_query(self, query_string, species=None, cached=True, store=True):
         """
         Execute a SPARQL query and return the result.
 
@@ -160,6 +187,10 @@ class SckanCompare(object):
             The species to consider in the query, if applicable.
         cached : bool, optional
             Whether to use cached data if available. Defaults to False.
+        store : bool, optional
+            Whether to cache the fetched result. Defaults to True; disable for
+            results never read back from the cache, or stored elsewhere
+            (e.g. in the pathway store).
 
         Returns
         -------
@@ -185,14 +216,73 @@ class SckanCompare(object):
                 now = time.time()
                 if (now - cached_time) > (self.cache_manager.max_cache_days * 86400):
                     # if outdated, remove the item; fetch afresh
-                    self.cache.pop(query_with_species + self.endpoint)
+                    self.cache_manager.cache.pop(query_with_species + self.endpoint)
                 else:
                     # return cached data
-                    return data
+                    return utils.intern_rows(data, self.intern_table)
         data = query.sparql_query(query_with_species, endpoint=self.endpoint)
         # cache the result
-        self.cache_manager.cache_data(query_with_species + self.endpoint, data)
-        return data
+        if store:
+            self.cache_manager.cache_data(query_with_species + self.endpoint, data)
+        return utils.intern_rows(data, self.intern_table)
+
+    def refresh_pathway_store(self, delta=True):
+        """
+        Refresh the local pathway store from the data source.
+
+        In delta mode, only per-neuron fingerprints are fetched and compared
+        with the stored snapshot; just the changed or new neurons are then
+        re-queried and patched into the store. Otherwise, or if no snapshot
+        is available, the complete pathway data is fetched.
+        The refreshed store replaces `self.pathway_store` with a single
+        assignment, so that it can be refreshed while being read by other threads.
+
+        Parameters
+        ----------
+        delta : bool, optional
+            Whether to fetch only the neurons changed since the last refresh. Defaults to True.
+
+        Returns
+        -------
+        PathwayStore
+            The refreshed pathway store (also available as `self.pathway_store`).
+        """
+        store_key = "pathway_store" + self.endpoint
+        store = self.pathway_store
+        if store is None:
+            cached_data = self.cache_manager.get_cached_data(store_key)
+            if cached_data:
+                store = PathwayStore.from_dict(cached_data[1])
+
+        fingerprints = get_fingerprints(self.execute_query(query.neuron_fingerprint_query, cached=False, store=False))
+        if store is None or not delta:
+            data = self.execute_query(query.neuron_path_all_species_query, cached=False, store=False)
+            version = store.version + 1 if store else 0
+            store = PathwayStore.from_result(data, fingerprints)
+            store.version = version
+        else:
+            # patch a copy, keeping the current store intact for readers
+            store = store.copy()
+            changed, _ = store.get_changed_neurons(fingerprints)
+            data = [list(store.header)]
+            for idx in range(0, len(changed), globals.DELTA_QUERY_BATCH_SIZE):
+                neuron_values = " ".join("<{}>".format(neuron_iri) for neuron_iri
+                                         in changed[idx:idx + globals.DELTA_QUERY_BATCH_SIZE])
+                data.extend(self.execute_query(
+                    query.neuron_path_values_query.format(neuron_values=neuron_values),
+                    cached=False, store=False)[1:])
+            store.apply_delta(data, fingerprints)
+
+        self.cache_manager.cache_data(store_key, store.to_dict())
+        # rebuild the intern table from the refreshed store, dropping the strings of
+        # replaced data, so that it does not grow with every refresh
+        intern_table = {}
+        for rows in store.rows_by_neuron.values():
+            for row in rows:
+                utils.intern_strings(row, intern_table)
+        self.intern_table = intern_table
+        self.pathway_store = store
+        return store
     
     def replace_species_synonyms_dataframe(self, df):
         """
@@ -216,7 +306,7 @@ class SckanCompare(object):
 
         # update values in dataframe
         if 'Species' in df.columns:
-            df['Species'] = df['Species_link'].map(uri_label_dict)
+            df['Species'] = utils.map_categories(df['Species_link'], uri_label_dict)
         return df
 
     def replace_region_synonyms_dataframe(self, df, species):
@@ -248,13 +338,135 @@ class SckanCompare(object):
 
         # update values in dataframe
         if 'Region_A' in df.columns:
-            df['Region_A'] = df['A'].map(uri_label_dict)
+            df['Region_A'] = utils.map_categories(df['A'], uri_label_dict)
         if 'Region_B' in df.columns:
-            df['Region_B'] = df['B'].map(uri_label_dict)
+            df['Region_B'] = utils.map_categories(df['B'], uri_label_dict)
         if 'Region_C' in df.columns:
-            df['Region_C'] = df['C'].map(uri_label_dict)
+            df['Region_C'] = utils.map_categories(df['C'], uri_label_dict)
         return df
 
+    def get_species_dataframe(self, species):
+        """
+        Get the normalized pathway table of a species, from the local pathway store.
+
+        The table is computed only once per species and version of the store
+        (see refresh_pathway_store()); the store is loaded if not available yet.
+        Without a store, the tables loaded from a snapshot are used (see load_snapshot()).
+        The returned DataFrame is shared and should not be modified.
+
+        Parameters
+        ----------
+        species : str
+            The species for which to get the table.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The DataFrame with the pathways of the species, with unique region labels.
+        """
+        store = self.pathway_store
+        if store is None and self.snapshot_version is not None:
+            if species not in self.species_tables:
+                raise ValueError("{} not available in snapshot!".format(species))
+            return self.species_tables[species][1]
+        if store is None:
+            store = self.refresh_pathway_store()
+        version, df = self.species_tables.get(species, (None, None))
+        if version != store.version:
+            df = self.get_filtered_dataframe(store.to_result(), species=species,
+                                             filter_column="Species", filter_value=species)
+            self.species_tables[species] = (store.version, df)
+        return df
+
+    def get_data_version(self):
+        """
+        Get the version of the pathway data in use.
+
+        Returns
+        -------
+        int or None
+            Version of the local pathway store, else of the loaded snapshot,
+            or None if no data is loaded.
+        """
+        if self.pathway_store is not None:
+            return self.pathway_store.version
+        return self.snapshot_version
+
+    def save_snapshot(self, directory, species_list=None):
+        """
+        Save the normalized pathway tables as a memory-mapped snapshot.
+
+        Parameters
+        ----------
+        directory : str
+            The snapshot directory; the current snapshot is replaced (atomically).
+        species_list : list, optional
+            The species to include. Defaults to all species in globals.AVAILABLE_SPECIES_MAPS.
+
+        Returns
+        -------
+        dict
+            The snapshot metadata.
+        """
+        if species_list is None:
+            species_list = list(globals.AVAILABLE_SPECIES_MAPS.keys())
+        tables = {species: self.get_species_dataframe(species) for species in species_list}
+        return snapshot.write_snapshot(directory, tables, version=self.get_data_version())
+
+    def load_snapshot(self, directory):
+        """
+        Load the normalized pathway tables from a memory-mapped snapshot.
+
+        The tables are shared read-only with all processes that load the same
+        snapshot, and used by get_species_dataframe() instead of a pathway store.
+
+        Parameters
+        ----------
+        directory : str
+            The snapshot directory.
+
+        Returns
+        -------
+        int
+            Version of the loaded data.
+        """
+        meta, tables = snapshot.load_snapshot(directory)
+        version = meta["version"]
+        self.species_tables = {species: (version, df) for species, df in tables.items()}
+        self.pathway_store = None
+        self.snapshot_version = version
+        self.snapshot_hash = meta["hash"]
+        return version
+
+    def get_region_pair_index(self, species):
+        """
+        Get the valid start (A) and end (B) region pairs of a species.
+
+        The index is computed only once per species and version of the
+        local pathway store, from the table of get_species_dataframe().
+
+        Parameters
+        ----------
+        species : str
+            The species for which to get the index.
+
+        Returns
+        -------
+        dict
+            Dict with the (sorted) labels of regions A as keys and sorted lists
+            of the labels of the regions B they connect to as values.
+        """
+        df = self.get_species_dataframe(species)
+        version = self.species_tables[species][0]
+        cached_version, index = self.region_pair_indexes.get(species, (None, None))
+        if cached_version != version:
+            pairs = df[["Region_A", "Region_B"]].dropna().drop_duplicates()
+            index = {}
+            for region_A, region_B in sorted(pairs.itertuples(index=False, name=None)):
+                index.setdefault(region_A, []).append(region_B)
+            self.region_pair_indexes[species] = (version, index)
+        return index
+
     def get_filtered_dataframe(self, result, species=None, filter_column=None, filter_value=None):
         """
         Create a filtered DataFrame from a query result.
@@ -284,27 +496,194 @@ class SckanCompare(object):
         if species not in globals.AVAILABLE_SPECIES_MAPS.keys():
             raise ValueError("Not currently implemented for species = {}!".format(species))
         
-        # convert data to pandas dataframe with column names
-        df_result = utils.get_dataframe(result)
+        with tracing.span("get_filtered_dataframe") as span:
+            # convert data to pandas dataframe with column names
+            # (categorical columns, sharing the strings of all queries of this object)
+            df_result = utils.get_dataframe(result, categorical=True, intern_table=self.intern_table)
 
-        # replace duplicate instances of species name
-        df_result = self.replace_species_synonyms_dataframe(df_result)
+            # replace duplicate instances of species name
+            df_result = self.replace_species_synonyms_dataframe(df_result)
 
-        # replace synonyms with unique labels for each region
-        df_result = self.replace_region_synonyms_dataframe(df_result, species)
+            # replace synonyms with unique labels for each region
+            df_result = self.replace_region_synonyms_dataframe(df_result, species)
 
-        # filter dataframe based on filter_column and filter_value
-        if filter_column:
-            if not filter_value:
-                raise ValueError("filter_value not for specified column {}!".format(filter_column))
-            df_result = utils.filter_dataframe(df_result, filter_column, filter_value)
+            # filter dataframe based on filter_column and filter_value
+            if filter_column:
+                if not filter_value:
+                    raise ValueError("filter_value not for specified column {}!".format(filter_column))
+                df_result = utils.filter_dataframe(df_result, filter_column, filter_value)
 
-        # remove duplicate rows based on all columns  
-        df_result = df_result.drop_duplicates()
+            # remove duplicate rows based on all columns  
+            df_result = df_result.drop_duplicates()
+            span.set(rows=df_result.shape[0])
 
         return df_result
 
-    def plot_dataframe_anatomy_vis(self, df, species=None, region_A=None, region_B=None, region_C=None):
+    def add_phenotypes_dataframe(self, df, circuit_role=False):
+        """
+        Add the phenotype (or circuit role) of each neuron to a path DataFrame.
+
+        Only the neuron to phenotype IRI pairs are retrieved from the data source;
+        these are joined locally with the given DataFrame via a neuron index.
+        The result corresponds to that of `query.neuron_path_phenotype_query`
+        (or `query.neuron_circuit_role_query`), without re-running the path query.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The DataFrame containing neuron path information (with column 'Neuron_IRI').
+        circuit_role : bool, optional
+            Whether to add the circuit roles instead of the neuronal phenotypes. Defaults to False.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The DataFrame with additional columns 'Phenotype_link' and 'Phenotype',
+            with one row per neuron phenotype. Neurons without phenotype are dropped.
+        """
+        if circuit_role:
+            pairs = self.execute_query(query.neuron_circuit_role_pairs_query)
+            labels = self.get_valid_phenotypes_circuit_role()
+        else:
+            pairs = self.execute_query(query.neuron_phenotype_pairs_query)
+            labels = self.get_valid_phenotypes()
+
+        df_pairs = utils.get_dataframe(pairs, categorical=True, intern_table=self.intern_table)
+        df_pairs["Phenotype"] = df_pairs["Phenotype_link"].map(labels)
+        neuron_index = df_pairs.set_index("Neuron_IRI")
+        return df.join(neuron_index, on="Neuron_IRI", how="inner")
+
+    def get_forward_connections(self):
+        """
+        Retrieve the forward connections between neurons from the data source.
+
+        Returns
+        -------
+        ConnectionGraph
+            Graph of the forward connections (edge list is cached along with other queries).
+        """
+        return ConnectionGraph.from_result(self.execute_query(query.neuron_forward_connection_query))
+
+    def find_neuron_chains(self, df, region_A, region_B, max_depth=globals.DEFAULT_MAX_CHAIN_DEPTH, max_chains=None):
+        """
+        Find chains of forward connected neurons from a region to a target region (organ).
+
+        A chain starts with a neuron having its soma in region_A and ends with a
+        neuron terminating in region_B. Chains are computed locally on the
+        cached forward connections.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The DataFrame containing neuron path information.
+        region_A : str
+            The start region (soma location) of the chain.
+        region_B : str
+            The target region (axon terminal or sensory location) of the chain.
+        max_depth : int, optional
+            Maximum number of neurons in a chain. Defaults to globals.DEFAULT_MAX_CHAIN_DEPTH.
+        max_chains : int, optional
+            Maximum number of chains to return. Defaults to None (no limit).
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame with one row per chain (shortest first), with the number of
+            neurons ('Length'), and the neuron IRIs and labels along the chain.
+        """
+        if not region_A:
+            raise ValueError("region_A needs to be specified!")
+        if not region_B:
+            raise ValueError("region_B needs to be specified!")
+
+        start_neurons = df.loc[df.Region_A == region_A, "Neuron_IRI"].unique()
+        target_neurons = df.loc[df.Region_B == region_B, "Neuron_IRI"].unique()
+        graph = self.get_forward_connections()
+        chains = graph.find_chains(start_neurons, target_neurons, max_depth, max_chains)
+
+        neuron_labels = dict(zip(df["Neuron_IRI"], df["Neuron_Label"]))
+        return pd.DataFrame({
+            "Length": [len(chain) for chain in chains],
+            "Neuron_IRIs": [" -> ".join(chain) for chain in chains],
+            "Neuron_Labels": [" -> ".join(neuron_labels.get(neuron, neuron) for neuron in chain)
+                              for chain in chains],
+        })
+
+    def get_memory_report(self, tables):
+        """
+        Report the memory used by each of the given tables.
+
+        Parameters
+        ----------
+        tables : dict
+            Dict with table names as keys and DataFrames (or query results as lists) as values.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame indexed by table name, with the number of rows ('Rows'),
+            the memory used in bytes ('Bytes') and per row ('Bytes_per_row').
+        """
+        report = {}
+        for name, table in tables.items():
+            num_rows = table.shape[0] if isinstance(table, pd.DataFrame) else len(table) - 1
+            num_bytes = utils.get_memory_usage(table)
+            report[name] = {
+                "Rows": num_rows,
+                "Bytes": num_bytes,
+                "Bytes_per_row": num_bytes / num_rows if num_rows else 0
+            }
+        return pd.DataFrame.from_dict(report, orient="index")
+
+    def enable_memory_profiling(self, budgets=None, on_exceed="warn"):
+        """
+        Enable recording the peak and retained memory of each processing stage
+        (response text, CSV rows, DataFrame, normalized frame and figure).
+
+        Stages are traced process-wide, i.e. also those of other SckanCompare objects.
+        Profiling slows down processing; it is meant for sizing and regression checks.
+
+        Parameters
+        ----------
+        budgets : dict, optional
+            Dict with stage names (e.g. 'normalized_frame') as keys and the maximum
+            peak memory in MB (or dicts with keys 'peak' and/or 'retained') as values.
+        on_exceed : str, optional
+            'warn' to issue a RuntimeWarning, or 'raise' to raise a MemoryError
+            when a stage exceeds its budget. Defaults to 'warn'.
+
+        Returns
+        -------
+        memprofile.MemoryProfiler
+            The memory profiler.
+        """
+        self.disable_memory_profiling()
+        self.memory_profiler = memprofile.MemoryProfiler(budgets=budgets, on_exceed=on_exceed).start()
+        return self.memory_profiler
+
+    def disable_memory_profiling(self):
+        """
+        Disable recording the memory of the processing stages; the recorded profile is kept.
+        """
+        if self.memory_profiler is not None:
+            self.memory_profiler.stop()
+
+    def get_memory_profile(self):
+        """
+        Get the memory recorded for each processing stage.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame indexed by stage, with the peak and retained memory in MB
+            and the number of runs exceeding the budgets (see `memprofile.MemoryProfiler.get_report`).
+        """
+        if self.memory_profiler is None:
+            raise ValueError("Memory profiling needs to be enabled!")
+        return self.memory_profiler.get_report()
+
+    def plot_dataframe_anatomy_vis(self, df, species=None, region_A=None, region_B=None, region_C=None,
+                                   aggregate=False, min_count=None):
         """
         Plot anatomical connectivity map based on a DataFrame.
 
@@ -320,6 +699,11 @@ class SckanCompare(object):
             The target region for filtering.
         region_C : str, optional
             The intermediate region for filtering.
+        aggregate : bool, optional
+            Whether to draw each distinct route only once, with its width
+            encoding the number of neurons. Recommended for dense maps. Defaults to False.
+        min_count : int, optional
+            With aggregate, hide routes with fewer neurons than min_count.
 
         Returns
         -------
@@ -330,7 +714,7 @@ class SckanCompare(object):
         vis = AntomyVis(species)
         
         # plot all connections in dataframe
-        vis.plot_dataframe(df)
+        vis.plot_dataframe(df, aggregate=aggregate, min_count=min_count)
 
         return vis.fig
     
@@ -360,4 +744,25 @@ class SckanCompare(object):
         # plot all connections in dataframe
         vis.plot_figure(df, region_A, region_B)
 
-        return vis.fig
\ No newline at end of file
+        return vis.fig
+
+    def plot_block_gallery(self, df, pairs=None, max_workers=None):
+        """
+        Plot the block visualizations of many (Region_A, Region_B) pairs of a DataFrame.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The DataFrame containing connectivity information.
+        pairs : list, optional
+            List of (Region_A, Region_B) tuples. Defaults to all pairs in the DataFrame.
+        max_workers : int, optional
+            Number of worker processes; plotted in the current process if None.
+
+        Returns
+        -------
+        dict
+            Dict with (Region_A, Region_B) tuples as keys and figure specs as values.
+            Use `gallery.write_block_gallery` to write them to a single HTML page.
+        """
+        return gallery.get_block_gallery(df, pairs=pairs, max_workers=max_workers)
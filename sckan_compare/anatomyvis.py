@@ -5,12 +5,20 @@ License: Apache License 2.0
 """
 
 import os
+import copy
 import json
 import pkg_resources
 import numpy as np
 import plotly.graph_objects as go
 
 from . import globals
+from . import tracing
+from . import geometry
+from . import export
+from . import coordmap
+
+# compiled background layout for each species, shared by all AntomyVis objects
+_background_layouts = {}
 
 
 class AntomyVis(object):
@@ -28,6 +36,8 @@ class AntomyVis(object):
     ----------
     region_dict : dict
         Dictionary mapping region names to (x, y) coordinates.
+    coord_map : CoordinateMap
+        Precompiled coordinate map of the species, shared by all AntomyVis objects.
     species : str
         The species for which the visualization is being created.
     SCALE : int
@@ -38,12 +48,12 @@ class AntomyVis(object):
         Maximum Y coordinate.
     NODE_RADIUS : float
         Radius of the node markers.
-    fig : go.FigureWidget
-        Plotly figure widget for visualization.
+    fig : go.FigureWidget or go.Figure
+        Plotly figure (widget) for visualization.
 
     Methods
     -------
-    __init__(region_dict, species):
+    __init__(species, widget=True):
         Initialize the AntomyVis class.
     get_json_species_map(species=None):
         Load a JSON species mapping of region names to (x, y) coordinates for anatomical visualization.
@@ -53,12 +63,20 @@ class AntomyVis(object):
         Draw a polygonal region on the visualization.
     draw_background():
         Draw the anatomical background for species.
+    compile_background(species):
+        Compile the anatomical background for species into a figure layout.
     mark_node(region, color_border="#FF0000", color_fill="#FFFF00", small=False):
         Mark a node (brain region) on the visualization.
+    mark_nodes(df, max_names=10):
+        Mark the nodes (brain regions) of all rows of a DataFrame, each only once.
     interpolate_coordinates(point1, point2, resolution=0.1):
         Interpolate between two cartesian coordinates using NumPy.
-    plot_dataframe(df):
+    plot_dataframe(df, batched=True, aggregate=False, min_count=None):
         Plot dataframe connectivity info.
+    draw_edges(df, color="#FF0000", linewidth=2, labels=None):
+        Draw the edges (connections) of all rows of a DataFrame as a single trace.
+    draw_routes(df, min_count=None, max_names=10, color="#FF0000"):
+        Draw each distinct route once, with its width encoding the number of neurons.
     draw_edge_AB(region1, region2, neuron=None):
         Draw an edge (connection) between two nodes (regions) A and B.
     draw_edge_ABC(region1, region2, region3, neuron=None):
@@ -67,9 +85,11 @@ class AntomyVis(object):
         Display the Plotly figure widget.
     get_figure():
         Get the Plotly figure widget.
+    get_figure_spec(precision=3):
+        Get a minimized spec of the figure.
     """
 
-    def __init__(self, species):
+    def __init__(self, species, widget=True):
         """
         Initialize the AntomyVis class.
 
@@ -77,6 +97,9 @@ class AntomyVis(object):
         ----------
         species : str
             The species for which the visualization is being created.
+        widget : bool, optional
+            Whether to create a go.FigureWidget (e.g. for notebooks), else a
+            plain go.Figure without widget overhead. Defaults to True.
         """
         if not species:
             raise ValueError("species needs to be specified!")
@@ -84,27 +107,23 @@ class AntomyVis(object):
             raise ValueError("Not currently implemented for species = {}!".format(species))
         
         self.species = species
-        # get the species specific visual region mapping (X,Y)
-        self.region_dict = self.get_json_species_map(species)
+        # get the species specific visual region mapping (X,Y);
+        # compiled only once per species
+        self.coord_map = coordmap.get_coordinate_map(species)
+        self.region_dict = self.coord_map.get_region_dict()
 
         self.SCALE = 50
         self.MAX_X = 43
         self.MAX_Y = 18
         self.NODE_RADIUS = 0.2
 
-        self.fig = go.FigureWidget()
-        self.fig.layout.hovermode = 'closest'
-        self.fig.layout.hoverdistance = -1 # ensures no "gaps" for selecting sparse data
-
-        self.fig.update_xaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
-        self.fig.update_yaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
-        self.fig.update_layout(showlegend=False)
-        self.fig.update_yaxes(range = [self.MAX_Y+3, 0])
-        self.fig.update_xaxes(range = [0, self.MAX_X])
-        self.fig.update_layout(height=int(500))
-
-        # draw the anatomical background corresponding to the species
-        self.draw_background(species)
+        # clone the anatomical background corresponding to the species;
+        # compiled (and validated) only once per species
+        with tracing.span("anatomy_background"):
+            if species not in _background_layouts:
+                _background_layouts[species] = self.compile_background(species)
+            fig_class = go.FigureWidget if widget else go.Figure
+            self.fig = fig_class({"layout": copy.deepcopy(_background_layouts[species])}, _validate=False)
 
     def get_json_species_map(self, species=None):
         """
@@ -129,16 +148,7 @@ class AntomyVis(object):
             raise ValueError("species needs to be specified!")
         if species not in globals.AVAILABLE_SPECIES_MAPS.keys():
             raise ValueError("{} visual map not currently available!".format(species))
-        
-        datapath = pkg_resources.resource_filename("sckan_compare", "data")
-        filepath = os.path.join(datapath, globals.AVAILABLE_SPECIES_MAPS[species])
-        with open(filepath, encoding='utf-8-sig') as json_file:
-            data = json.load(json_file)
-
-        region_dict = {}
-        for item in data:
-            region_dict[item["Name"]] = [int(item["X"]), int(item["Y"])]
-        return region_dict
+        return coordmap.get_coordinate_map(species).get_region_dict()
 
     def draw_rect(self,
                 start_x,
@@ -231,6 +241,60 @@ class AntomyVis(object):
             else:
                 self.draw_poly(*item)
         
+    def compile_background(self, species):
+        """
+        Compile the anatomical background for species into a figure layout.
+
+        The background regions are drawn as layout shapes (below all traces),
+        along with the axes and general layout settings of the visualization.
+
+        Parameters
+        ----------
+        species : str
+            The species for which to compile the background.
+
+        Returns
+        -------
+        dict
+            The figure layout, as a (validated) plotly JSON dict.
+        """
+        fig = go.Figure()
+        fig.layout.hovermode = 'closest'
+        fig.layout.hoverdistance = -1 # ensures no "gaps" for selecting sparse data
+
+        fig.update_xaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
+        fig.update_yaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
+        fig.update_layout(showlegend=False)
+        fig.update_yaxes(range = [self.MAX_Y+3, 0])
+        fig.update_xaxes(range = [0, self.MAX_X])
+        fig.update_layout(height=int(500))
+
+        datapath = pkg_resources.resource_filename("sckan_compare", "data")
+        filepath = os.path.join(datapath, globals.AVAILABLE_SPECIES_ANATOMY[species])
+        with open(filepath, encoding='utf-8-sig') as json_file:
+            data = json.load(json_file)
+
+        shapes = []
+        for item in data:
+            if isinstance(item[0], int):
+                start_x, start_y, width, height, *colors = item
+                path = "M{0},{1} L{2},{1} L{2},{3} L{0},{3} Z".format(
+                    start_x, start_y, start_x+width, start_y+height)
+            else:
+                xlist, ylist, *colors = item
+                path = "M" + " L".join("{},{}".format(x, y) for x, y in zip(xlist, ylist)) + " Z"
+            color_border, color_fill = colors if colors else ("#4051BF", "#C5CAE9")
+            shapes.append(dict(
+                type="path",
+                xref="x", yref="y",
+                path=path,
+                line_color=color_border,
+                fillcolor=color_fill,
+                layer="below"
+            ))
+        fig.update_layout(shapes=shapes)
+        return fig.layout.to_plotly_json()
+
     def mark_node(self,
                   region,
                   color_border="#FF0000",
@@ -272,6 +336,63 @@ class AntomyVis(object):
             name=region
         ))
 
+    def mark_nodes(self, df, max_names=10):
+        """
+        Mark the nodes (brain regions) of all rows of a DataFrame, each only once.
+
+        All start and end regions (A, B) are drawn as a single marker trace,
+        and all intermediate regions (C) as another. The hover text of each
+        node lists the number of neurons passing through it and their names.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Dataframe containing the required data.
+        max_names : int, optional
+            Maximum number of neuron names listed in the hover text of a node.
+        """
+        node_groups = [
+            (["Region_A", "Region_B"], "#FF0000", "#FFFF00", 5),
+            (["Region_C"], "#000000", "#00FF00", 7),
+        ]
+        for columns, color_border, color_fill, size_factor in node_groups:
+            # collect the (unique) neurons of each node, in order of appearance
+            nodes = {}
+            for column in columns:
+                if column not in df.columns:
+                    continue
+                for region, neuron in zip(df[column], df["Neuron_Label"]):
+                    nodes.setdefault(region, {})[neuron] = None
+            if not nodes:
+                continue
+
+            hover_text = []
+            for region, neurons in nodes.items():
+                names = list(neurons)
+                if len(names) > max_names:
+                    names = names[:max_names] + ["..."]
+                hover_text.append("{}<br>{} neuron(s):<br>{}".format(
+                    region, len(neurons), "<br>".join(names)))
+
+            coords = self.coord_map.get_coordinates(list(nodes)) + 0.5
+            self.fig.add_trace(go.Scattergl(
+                x=coords[:, 0],
+                y=coords[:, 1],
+                mode = 'markers',
+                marker_symbol = 'circle',
+                marker_size = int(self.SCALE/size_factor),
+                marker=dict(
+                    color=color_fill,
+                    line=dict(
+                        color=color_border,
+                        width=2
+                    )
+                ),
+                text=hover_text,
+                hoverinfo="text",
+                showlegend=False
+            ))
+
     def interpolate_coordinates(self, point1, point2, resolution=0.1):
         """
         Interpolate between two cartesian coordinates using NumPy.
@@ -290,18 +411,9 @@ class AntomyVis(object):
         tuple
             Two lists of interpolated x and y coordinates.
         """
-        x1, y1 = point1
-        x2, y2 = point2
-        
-        num_steps = int(1 / resolution)
-        t = np.linspace(0, 1, num_steps + 1)
-        
-        interpolated_x = x1 + (x2 - x1) * t
-        interpolated_y = y1 + (y2 - y1) * t
-        
-        return list(interpolated_x), list(interpolated_y)
+        return geometry.interpolate_coordinates(point1, point2, resolution)
 
-    def plot_dataframe(self, df):
+    def plot_dataframe(self, df, batched=True, aggregate=False, min_count=None):
         """
         Plot dataframe connectivity info.
         
@@ -309,17 +421,38 @@ class AntomyVis(object):
         ----------
         df : pd.DataFrame
             Dataframe containing the required data.
+        batched : bool, optional
+            Whether to draw all edges as a single WebGL trace, instead of
+            one trace per row. Defaults to True.
+        aggregate : bool, optional
+            Whether to draw each distinct route (A->C->B) only once, with its
+            width encoding the number of neurons. Defaults to False.
+        min_count : int, optional
+            With aggregate, hide routes with fewer neurons than min_count.
         """
-        for idx in range(df.shape[0]):
-            if 'Region_C' in df.columns:
-                self.add_connection(region_A=df.iloc[idx,3],
-                                        region_B=df.iloc[idx,5],
-                                        region_C=df.iloc[idx,7],
-                                        neuron=df.iloc[idx,1])
-            else:
-                self.add_connection(region_A=df.iloc[idx,3],
-                                        region_B=df.iloc[idx,5],
-                                        neuron=df.iloc[idx,1])
+        with tracing.span("anatomy_plot", rows=df.shape[0]) as span:
+            if aggregate:
+                routes = self.draw_routes(df, min_count=min_count)
+                # only mark the nodes of the routes drawn
+                self.mark_nodes(routes.explode("Neurons").rename(columns={"Neurons": "Neuron_Label"}))
+                span.set(traces=len(self.fig.data), routes=routes.shape[0])
+                return
+            if batched:
+                self.draw_edges(df)
+                self.mark_nodes(df)
+                span.set(traces=len(self.fig.data))
+                return
+            for idx in range(df.shape[0]):
+                if 'Region_C' in df.columns:
+                    self.add_connection(region_A=df.iloc[idx,3],
+                                            region_B=df.iloc[idx,5],
+                                            region_C=df.iloc[idx,7],
+                                            neuron=df.iloc[idx,1])
+                else:
+                    self.add_connection(region_A=df.iloc[idx,3],
+                                            region_B=df.iloc[idx,5],
+                                            neuron=df.iloc[idx,1])
+            span.set(traces=len(self.fig.data))
 
     def add_connection(self, region_A=None, region_B=None, region_C=None, neuron=None):
         """
@@ -353,6 +486,101 @@ class AntomyVis(object):
             # A->B
             self.draw_edge_AB(region_A, region_B, neuron)
 
+    def draw_edges(self, df, color="#FF0000", linewidth=2, labels=None):
+        """
+        Draw the edges (connections) of all rows of a DataFrame as a single trace.
+
+        Edges (A->B, or A->C->B if 'Region_C' is available) are separated by
+        gaps within one WebGL line trace, with the neuron name as hover text
+        on each point. The geometry of all edges is computed in one step
+        and passed to plotly as NumPy arrays.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Dataframe containing the required data.
+        color : str, optional
+            Color of the edges.
+        linewidth : int, optional
+            Width of the edges.
+        labels : array-like, optional
+            Hover text for each row. Defaults to the neuron names ('Neuron_Label').
+        """
+        if labels is None:
+            labels = df["Neuron_Label"]
+        if 'Region_C' in df.columns:
+            stops = ["Region_A", "Region_C", "Region_B"]
+        else:
+            stops = ["Region_A", "Region_B"]
+        # node centre coordinates of each stop, for all rows
+        coords = [self.coord_map.get_coordinates(df[column]) + 0.5 for column in stops]
+
+        # interpolate all segments at once, for adding hover text on line (to display neuron name)
+        points = geometry.interpolate_segments(np.concatenate(coords[:-1]), np.concatenate(coords[1:]))
+        labels = np.tile(np.asarray(labels, dtype=object), len(stops) - 1)
+        x_all, y_all, text_all = geometry.get_polyline_buffers(points, labels)
+
+        self.fig.add_trace(go.Scattergl(
+            x=x_all,
+            y=y_all,
+            mode = 'lines',
+            text=text_all,
+            hoverinfo="text",
+            line_color=color,
+            line={"width":linewidth},
+            showlegend=False
+        ))
+
+    def draw_routes(self, df, min_count=None, max_names=10, color="#FF0000"):
+        """
+        Draw each distinct route once, with its width encoding the number of neurons.
+
+        Rows are grouped by route (A->C->B, or A->B if 'Region_C' is not available).
+        Routes with the same width are drawn as a single trace, with the list
+        of neurons of each route as hover text.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Dataframe containing the required data.
+        min_count : int, optional
+            Hide routes with fewer neurons than min_count.
+        max_names : int, optional
+            Maximum number of neuron names listed in the hover text of a route.
+        color : str, optional
+            Color of the routes.
+
+        Returns
+        -------
+        pd.DataFrame
+            The routes drawn, with the region columns, the neuron names ('Neurons')
+            and the number of neurons ('Count') of each route.
+        """
+        if 'Region_C' in df.columns:
+            stops = ["Region_A", "Region_C", "Region_B"]
+        else:
+            stops = ["Region_A", "Region_B"]
+        routes = df.groupby(stops, observed=True, sort=False)["Neuron_Label"].unique()
+        routes = routes.reset_index(name="Neurons")
+        routes["Count"] = routes["Neurons"].str.len()
+        if min_count:
+            routes = routes[routes["Count"] >= min_count]
+
+        hover_text = []
+        for neurons in routes["Neurons"]:
+            names = list(neurons)
+            if len(names) > max_names:
+                names = names[:max_names] + ["..."]
+            hover_text.append("{} neuron(s):<br>{}".format(len(neurons), "<br>".join(names)))
+
+        # width grows logarithmically with the number of neurons: 1 -> 2, 2 -> 4, 4 -> 6, ...
+        widths = np.minimum(2 + 2 * np.round(np.log2(routes["Count"].to_numpy(dtype=float))), 12)
+        hover_text = np.asarray(hover_text, dtype=object)
+        for width in np.unique(widths):
+            selected = widths == width
+            self.draw_edges(routes[selected], color=color, linewidth=int(width), labels=hover_text[selected])
+        return routes
+
     def draw_edge_AB(self,
                      region1,
                      region2,
@@ -494,3 +722,19 @@ class AntomyVis(object):
             The Plotly figure widget.
         """
         return self.fig
+
+    def get_figure_spec(self, precision=3):
+        """
+        Get a minimized spec of the figure.
+
+        Parameters
+        ----------
+        precision : int, optional
+            Number of decimals kept for coordinates. Defaults to 3.
+
+        Returns
+        -------
+        dict
+            The figure spec, with keys 'data' and 'layout'.
+        """
+        return export.get_compact_figure_spec(self.fig, precision=precision)
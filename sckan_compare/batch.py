@@ -0,0 +1,304 @@
+"""
+Batch species comparison jobs for SckanCompare package.
+
+Runs all pairwise species comparisons across a process pool and writes
+tables and figures to an output directory.
+
+License: Apache License 2.0
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from . import globals
+from . import query
+from . import utils
+from .anatomyvis import AntomyVis
+
+# columns identifying a route (A->C->B) independent of synonym labels
+ROUTE_COLUMNS = ["A", "B", "C"]
+
+# read-only species tables shared with the worker processes
+_shared_tables = None
+
+
+def _init_worker(tables):
+    """
+    Initialize a worker process with the shared species tables.
+
+    Parameters
+    ----------
+    tables : dict
+        Dict with species labels as keys and pathway DataFrames as values.
+    """
+    global _shared_tables
+    _shared_tables = tables
+
+
+def get_slug(text):
+    """
+    Convert a species label (or pair of labels) into a file system friendly name.
+
+    Parameters
+    ----------
+    text : str
+        The text to be converted.
+
+    Returns
+    -------
+    str
+        Lower case text with all non-alphanumeric characters replaced by '_'.
+    """
+    return re.sub(r"[^0-9a-zA-Z]+", "_", text).strip("_").lower()
+
+
+def get_species_tables(sc, result, species_list):
+    """
+    Create the normalized pathway table for each species.
+
+    Species with an available coordinate map are normalized via
+    `SckanCompare.get_filtered_dataframe`. For other species, only the species
+    synonyms are resolved, as region labels cannot be mapped.
+
+    Parameters
+    ----------
+    sc : SckanCompare
+        The SckanCompare object used to normalize the data.
+    result : list
+        The query result (e.g. of `query.neuron_path_all_species_query`).
+    species_list : list
+        The species for which to create tables.
+
+    Returns
+    -------
+    dict
+        Dict with species labels as keys and DataFrames as values.
+    """
+    tables = {}
+    df_all = None
+    for species in species_list:
+        if species in globals.AVAILABLE_SPECIES_MAPS.keys():
+            tables[species] = sc.get_filtered_dataframe(result, species=species,
+                                                        filter_column="Species", filter_value=species)
+            continue
+        if df_all is None:
+            df_all = sc.replace_species_synonyms_dataframe(utils.get_dataframe(result))
+        tables[species] = utils.filter_dataframe(df_all, "Species", species).drop_duplicates()
+    return tables
+
+
+def compare_species_tables(df_1, df_2):
+    """
+    Compare the routes (A->C->B) of two species.
+
+    Routes are matched on the region IRIs, so that differing synonym labels
+    do not affect the comparison.
+
+    Parameters
+    ----------
+    df_1 : pandas.DataFrame
+        Pathway table of the first species.
+    df_2 : pandas.DataFrame
+        Pathway table of the second species.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per route, with the route labels and the number of
+        neurons observed for the route in each species ('Neurons_1', 'Neurons_2').
+    """
+    counts = []
+    for df in (df_1, df_2):
+        counts.append(df.groupby(ROUTE_COLUMNS, observed=True)["Neuron_IRI"].nunique())
+    df_compare = pd.concat(counts, axis=1, keys=["Neurons_1", "Neurons_2"]).fillna(0).astype(int)
+
+    # label each route using the first available label
+    labels = pd.concat([df_1, df_2])[ROUTE_COLUMNS + ["Region_A", "Region_B", "Region_C"]]
+    labels = labels.astype(object).dropna().drop_duplicates(ROUTE_COLUMNS).set_index(ROUTE_COLUMNS)
+    df_compare = df_compare.join(labels).reset_index()
+    return df_compare[ROUTE_COLUMNS + ["Region_A", "Region_B", "Region_C", "Neurons_1", "Neurons_2"]]
+
+
+def run_pair_task(species_1, species_2, output_dir):
+    """
+    Compare two species and write the comparison table and figures.
+
+    Executed in the worker processes; uses the shared species tables.
+
+    Parameters
+    ----------
+    species_1 : str
+        The first species.
+    species_2 : str
+        The second species.
+    output_dir : str
+        The output directory of the batch job.
+
+    Returns
+    -------
+    dict
+        Task summary with the number of routes and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    df_1 = _shared_tables[species_1]
+    df_2 = _shared_tables[species_2]
+
+    pair_dir = os.path.join(output_dir, get_slug(species_1 + "__" + species_2))
+    os.makedirs(pair_dir, exist_ok=True)
+
+    df_compare = compare_species_tables(df_1, df_2)
+    df_compare.to_csv(os.path.join(pair_dir, "comparison.csv"), index=False)
+
+    # map of the routes shared by both species, for each species with a visual map
+    shared = df_compare[(df_compare.Neurons_1 > 0) & (df_compare.Neurons_2 > 0)]
+    for species, df in ((species_1, df_1), (species_2, df_2)):
+        if species not in globals.AVAILABLE_SPECIES_MAPS.keys():
+            continue
+        df_shared = df.merge(shared[ROUTE_COLUMNS], on=ROUTE_COLUMNS)
+        vis = AntomyVis(species)
+        vis.plot_dataframe(df_shared.dropna(subset=["Region_A", "Region_B", "Region_C"]))
+        vis.get_figure().write_html(
+            os.path.join(pair_dir, "shared_{}.html".format(get_slug(species))),
+            include_plotlyjs="cdn")
+
+    return {
+        "species_1": species_1,
+        "species_2": species_2,
+        "routes": int(df_compare.shape[0]),
+        "shared_routes": int(shared.shape[0]),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def load_progress(filepath):
+    """
+    Load the progress of a batch job.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the progress file.
+
+    Returns
+    -------
+    dict
+        Dict with task names as keys and task summaries as values.
+    """
+    if not os.path.exists(filepath):
+        return {}
+    with open(filepath, encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def save_progress(filepath, progress):
+    """
+    Save the progress of a batch job, replacing the previous file atomically.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the progress file.
+    progress : dict
+        Dict with task names as keys and task summaries as values.
+    """
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, "w", encoding="utf-8") as json_file:
+        json.dump(progress, json_file, indent=2)
+    os.replace(temp_filepath, filepath)
+
+
+def run_pairwise_comparisons(sc, output_dir, species_list=None, result=None, max_workers=None):
+    """
+    Run the comparison for every pair of species across a process pool.
+
+    Completed tasks are recorded in 'progress.json' within `output_dir`;
+    re-running the job skips these, so that an interrupted job can be resumed.
+
+    Parameters
+    ----------
+    sc : SckanCompare
+        The SckanCompare object used to retrieve and normalize the data.
+    output_dir : str
+        The directory to write tables and figures to.
+    species_list : list, optional
+        The species to be compared. Defaults to all species in
+        globals.AVAILABLE_SPECIES_MAPS followed by all other valid species.
+    result : list, optional
+        The query result to be used. Defaults to the result of
+        `query.neuron_path_all_species_query`.
+    max_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Summary (incl. timing) of all tasks of the job.
+    """
+    if result is None:
+        result = sc.execute_query(query.neuron_path_all_species_query)
+    if species_list is None:
+        species_list = list(globals.AVAILABLE_SPECIES_MAPS.keys())
+        for species in dict.fromkeys(sc.valid_species_list):
+            if species not in species_list:
+                species_list.append(species)
+    for species in species_list:
+        if species not in sc.valid_species_list:
+            raise ValueError("Invalid species specified: {}!".format(species))
+
+    os.makedirs(output_dir, exist_ok=True)
+    progress_filepath = os.path.join(output_dir, "progress.json")
+    progress = load_progress(progress_filepath)
+
+    tasks = {}
+    for species_1, species_2 in itertools.combinations(species_list, 2):
+        task_name = species_1 + "__" + species_2
+        if task_name not in progress:
+            tasks[task_name] = (species_1, species_2)
+
+    if tasks:
+        # species tables are normalized once and shared read-only with all workers
+        tables = get_species_tables(sc, result, species_list)
+        for species, df in tables.items():
+            df.to_csv(os.path.join(output_dir, "table_{}.csv".format(get_slug(species))), index=False)
+
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_worker,
+                                 initargs=(tables,)) as executor:
+            futures = {executor.submit(run_pair_task, species_1, species_2, output_dir): task_name
+                       for task_name, (species_1, species_2) in tasks.items()}
+            for future in as_completed(futures):
+                progress[futures[future]] = future.result()
+                save_progress(progress_filepath, progress)
+
+    return pd.DataFrame.from_dict(progress, orient="index")
+
+
+def main():
+    """
+    Command line entry point for the pairwise species comparison job.
+    """
+    # imported here to avoid a circular import
+    from . import SckanCompare
+
+    parser = argparse.ArgumentParser(description="Compare all pairs of species in SCKAN.")
+    parser.add_argument("output_dir", help="directory to write tables and figures to")
+    parser.add_argument("--species", nargs="+", default=None, help="species to compare (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--endpoint", default=globals.BLAZEGRAPH_ENDPOINT, help="SPARQL endpoint URL")
+    args = parser.parse_args()
+
+    sc = SckanCompare(endpoint=args.endpoint)
+    summary = run_pairwise_comparisons(sc, args.output_dir, species_list=args.species,
+                                       max_workers=args.workers)
+    print(summary.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,90 @@ License: Apache License 2.0
 """
 
 import os
+import copy
+import base64
 import pkg_resources
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
-from PIL import Image
+
+from . import tracing
+from . import geometry
+from . import export
+
+# names of the node icons (PNG files in the data folder)
+ICON_NAMES = ("node_A", "node_B", "node_C")
+
+# trace types drawn in block visualizations
+TRACE_TYPES = ("scatter",)
+
+# icons encoded as base64 data URIs, shared by all BlockVis objects
+_icon_sources = {}
+
+# compiled base layout (axes, template with icons), shared by all BlockVis objects
+_base_layout = {}
+
+
+def get_icon_sources():
+    """
+    Get the node icons as base64 encoded PNG data URIs; encoded only once per process.
+
+    Returns
+    -------
+    dict
+        Dict with icon names as keys and data URIs as values.
+    """
+    if not _icon_sources:
+        datapath = pkg_resources.resource_filename("sckan_compare", "data")
+        for name in ICON_NAMES:
+            with open(os.path.join(datapath, name + ".png"), "rb") as icon_file:
+                encoded = base64.b64encode(icon_file.read()).decode("ascii")
+            _icon_sources[name] = "data:image/png;base64," + encoded
+    return _icon_sources
+
+
+def get_base_layout():
+    """
+    Get the base layout of block visualizations; compiled (and validated) only once per process.
+
+    Returns
+    -------
+    dict
+        The layout as plain dict, not to be modified.
+    """
+    if not _base_layout:
+        fig = go.Figure()
+        fig.layout.hovermode = 'closest'
+        fig.layout.hoverdistance = -1 #ensures no "gaps" for selecting sparse data
+        fig.update_xaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
+        fig.update_yaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
+        fig.update_layout(height=int(500))
+        fig.update_layout(template="plotly_white")
+        fig.update_layout(showlegend=False)
+        # icons are embedded once in the template and referenced by name from
+        # each placed image; hidden in the template itself, as plotly draws
+        # named template items even when not referenced
+        fig.layout.template.layout.images = [
+            dict(
+                name=name,
+                source=source,
+                xref="x",
+                yref="y",
+                xanchor="center",
+                yanchor="middle",
+                sizex=128,
+                sizey=128,
+                opacity=1.0,
+                layer="above",
+                visible=False
+            ) for name, source in get_icon_sources().items()
+        ]
+        layout = fig.layout.to_plotly_json()
+        # only keep the template trace defaults of the trace types drawn
+        layout["template"]["data"] = {trace_type: styles for trace_type, styles in layout["template"]["data"].items()
+                                      if trace_type in TRACE_TYPES}
+        _base_layout.update(layout)
+    return _base_layout
 
 
 class BlockVis(object):
@@ -28,24 +108,26 @@ class BlockVis(object):
     MAX_X : int
         Maximum X coordinate.
     icons : dict
-        Dictionary of icons for nodes.
-    fig : go.FigureWidget
-        Plotly figure widget for visualization.
+        Dictionary of icons for nodes, as base64 encoded data URIs.
+    fig : go.FigureWidget or go.Figure
+        Plotly figure (widget) for visualization.
 
     Methods
     -------
-    __init__():
+    __init__(widget=True):
         Initialize the BlockVis class.
     interpolate_coordinates(point1, point2, resolution=0.1):
         Interpolate between two cartesian coordinates.
-    plot_figure(df, region_A, region_B):
+    plot_figure(df, region_A, region_B, batched=True, max_names=10):
         Plot the connectivity block visualization
+    draw_regions_C(list_region_C, hover_text, line_text=None):
+        Draw all regions C and their connections as a few combined traces.
     update_graph():
-        Update the layout of the figure.
+        Update the axis ranges of the figure.
     draw_block_bg(x0, y0, x1, y1, opacity, color):
         Draw a rectangular background block.
     draw_image(icon, x, y):
-        Draw an image on the visualization.
+        Draw an image (e.g. a node icon by name) on the visualization.
     draw_connections(x, y, label, color):
         Draw connections between nodes.
     add_text(x, y, text, fontsize=20):
@@ -56,29 +138,28 @@ class BlockVis(object):
         Display the Plotly figure widget.
     get_figure():
         Get the Plotly figure widget.
+    get_figure_spec(precision=3):
+        Get a minimized spec of the figure.
     """
 
 
-    def __init__(self):
+    def __init__(self, widget=True):
         """
         Initialize the BlockVis class.
+
+        Parameters
+        ----------
+        widget : bool, optional
+            Whether to create a go.FigureWidget (e.g. for notebooks), else a
+            plain go.Figure without widget overhead. Defaults to True.
         """
         self.SCALE = 150
         self.MAX_Y = 900
+        self.icons = get_icon_sources()
 
-        datapath = pkg_resources.resource_filename("sckan_compare", "data")
-        node_A = Image.open(os.path.join(datapath, "node_A.png"))
-        node_B = Image.open(os.path.join(datapath, "node_B.png"))
-        node_C = Image.open(os.path.join(datapath, "node_C.png"))
-        self.icons = {
-            "node_A": node_A,
-            "node_B": node_B,
-            "node_C": node_C
-        }
-
-        self.fig = go.FigureWidget()
-        self.fig.layout.hovermode = 'closest'
-        self.fig.layout.hoverdistance = -1 #ensures no "gaps" for selecting sparse data
+        # clone the base layout, incl. the template with the node icons
+        fig_class = go.FigureWidget if widget else go.Figure
+        self.fig = fig_class({"layout": copy.deepcopy(get_base_layout())}, _validate=False)
 
     def interpolate_coordinates(self, point1, point2, resolution=0.1):
         """
@@ -98,18 +179,9 @@ class BlockVis(object):
         tuple
             Two lists of interpolated x and y coordinates.
         """
-        x1, y1 = point1
-        x2, y2 = point2
-        
-        num_steps = int(1 / resolution)
-        t = np.linspace(0, 1, num_steps + 1)
-        
-        interpolated_x = x1 + (x2 - x1) * t
-        interpolated_y = y1 + (y2 - y1) * t
-        
-        return list(interpolated_x), list(interpolated_y)    
-
-    def plot_figure(self, df, region_A, region_B):
+        return geometry.interpolate_coordinates(point1, point2, resolution)
+
+    def plot_figure(self, df, region_A, region_B, batched=True, max_names=10):
         """
         Plot the connectivity block visualization.
 
@@ -121,107 +193,187 @@ class BlockVis(object):
             Name of region A.
         region_B : str
             Name of region B.
+        batched : bool, optional
+            Whether to draw all regions C and their connections as a few
+            combined traces, instead of a few traces per region C. Defaults to True.
+        max_names : int, optional
+            Maximum number of neuron names listed in the hover text of a region C.
         """
-        req_df = df[(df.Region_A == region_A) & (df.Region_B == region_B)]
-        list_region_C = req_df.Region_C.unique()
-
-        self.MAX_X = self.SCALE * len(list_region_C)
-        self.update_graph()
-
-        # region_A background
-        self.draw_block_bg(
-            x0=(self.MAX_X/2)-100,
-            y0=50,
-            x1=(self.MAX_X/2)+100,
-            y1=200,
-            opacity=0.2,
-            color="PaleTurquoise"
-        )
-        # region A icon
-        self.draw_image(
-            icon=self.icons["node_A"],
-            x=self.MAX_X/2,
-            y=125,
-        )
-        # region A label
-        self.add_text(
-            x=self.MAX_X/2-3,
-            y=0,
-            text=region_A
-        )
-        self.mark_node(x=self.MAX_X/2, y=125, label=region_A)
-        
-        # region_B background
-        self.draw_block_bg(
-            x0=(self.MAX_X/2)-100,
-            y0=self.MAX_Y-200,
-            x1=(self.MAX_X/2)+100,
-            y1=self.MAX_Y-50,
-            opacity=0.2,
-            color="LightGreen"
-        )
-        # region B icon
-        self.draw_image(
-            icon=self.icons["node_B"],
-            x=self.MAX_X/2-3,
-            y=self.MAX_Y-125,
-        )
-        # region B label
-        self.add_text(
-            x=self.MAX_X/2,
-            y=self.MAX_Y,
-            text=region_B
-        )
-        self.mark_node(x=self.MAX_X/2, y=self.MAX_Y-125, label=region_B)
-
-
-        # all region C and connections
-        for i in range(0,len(list_region_C)):
-            xtemp = (self.SCALE*i)+64
-            ytemp = self.MAX_Y/2
-
+        with tracing.span("block_plot", rows=df.shape[0]) as span:
+            req_df = df[(df.Region_A == region_A) & (df.Region_B == region_B)]
+            # neurons via each region C (missing C kept as its own block), in order of appearance
+            neurons_by_C = req_df.groupby("Region_C", observed=True, sort=False, dropna=False)["Neuron_Label"].unique()
+            list_region_C = ["" if pd.isna(region) else region for region in neurons_by_C.index]
+            hover_text = []
+            line_text = []
+            for region, neurons in zip(list_region_C, neurons_by_C):
+                names = [str(name) for name in neurons]
+                if len(names) > max_names:
+                    names = names[:max_names] + ["..."]
+                hover_text.append("{}<br>{} neuron(s):<br>{}".format(
+                    region, len(neurons), "<br>".join(names)))
+                # repeated for each point of the connections, hence kept short
+                line_text.append("{} ({} neuron(s))".format(region, len(neurons)))
+
+            self.MAX_X = self.SCALE * len(list_region_C)
+            self.update_graph()
+
+            # region_A background
+            self.draw_block_bg(
+                x0=(self.MAX_X/2)-100,
+                y0=50,
+                x1=(self.MAX_X/2)+100,
+                y1=200,
+                opacity=0.2,
+                color="PaleTurquoise"
+            )
+            # region A icon
             self.draw_image(
-                icon=self.icons["node_C"],
-                x=xtemp,
-                y=ytemp,
+                icon="node_A",
+                x=self.MAX_X/2,
+                y=125,
             )
+            # region A label
             self.add_text(
-                x=xtemp,
-                y=ytemp+100,
-                text=req_df.iloc[i,7],
-                fontsize=12
+                x=self.MAX_X/2-3,
+                y=0,
+                text=region_A
+            )
+            self.mark_node(x=self.MAX_X/2, y=125, label=region_A)
+
+            # region_B background
+            self.draw_block_bg(
+                x0=(self.MAX_X/2)-100,
+                y0=self.MAX_Y-200,
+                x1=(self.MAX_X/2)+100,
+                y1=self.MAX_Y-50,
+                opacity=0.2,
+                color="LightGreen"
             )
-            self.mark_node(x=xtemp, y=ytemp, label=req_df.iloc[i,7])
-            p1 = (self.MAX_X/2, 125)
-            p2 = (xtemp, ytemp)
-            x_new, y_new = self.interpolate_coordinates(p1, p2)
-            self.draw_connections(
-                x=x_new,
-                y=y_new,
-                label=req_df.iloc[i,1],
-                color="#FF0000"
+            # region B icon
+            self.draw_image(
+                icon="node_B",
+                x=self.MAX_X/2-3,
+                y=self.MAX_Y-125,
             )
-            p1 = (xtemp, ytemp)
-            p2 = (self.MAX_X/2, self.MAX_Y-125)
-            x_new, y_new = self.interpolate_coordinates(p1, p2)
-            self.draw_connections(
-                x=x_new,
-                y=y_new,
-                label=req_df.iloc[i,1],
-                color="#FF0000"
+            # region B label
+            self.add_text(
+                x=self.MAX_X/2,
+                y=self.MAX_Y,
+                text=region_B
             )
+            self.mark_node(x=self.MAX_X/2, y=self.MAX_Y-125, label=region_B)
+
+
+            if batched:
+                self.draw_regions_C(list_region_C, hover_text, line_text)
+                span.set(traces=len(self.fig.data))
+                return
+
+            # all region C and connections
+            for i in range(0,len(list_region_C)):
+                xtemp = (self.SCALE*i)+64
+                ytemp = self.MAX_Y/2
+
+                self.draw_image(
+                    icon="node_C",
+                    x=xtemp,
+                    y=ytemp,
+                )
+                self.add_text(
+                    x=xtemp,
+                    y=ytemp+100,
+                    text=list_region_C[i],
+                    fontsize=12
+                )
+                self.mark_node(x=xtemp, y=ytemp, label=list_region_C[i])
+                p1 = (self.MAX_X/2, 125)
+                p2 = (xtemp, ytemp)
+                x_new, y_new = self.interpolate_coordinates(p1, p2)
+                self.draw_connections(
+                    x=x_new,
+                    y=y_new,
+                    label=line_text[i],
+                    color="#FF0000"
+                )
+                p1 = (xtemp, ytemp)
+                p2 = (self.MAX_X/2, self.MAX_Y-125)
+                x_new, y_new = self.interpolate_coordinates(p1, p2)
+                self.draw_connections(
+                    x=x_new,
+                    y=y_new,
+                    label=line_text[i],
+                    color="#FF0000"
+                )
+            span.set(traces=len(self.fig.data))
+
+    def draw_regions_C(self, list_region_C, hover_text, line_text=None):
+        """
+        Draw all regions C and their connections as a few combined traces.
+
+        Parameters
+        ----------
+        list_region_C : list
+            Names of the regions C, in order of placement.
+        hover_text : list
+            Hover text of each region C, e.g. listing its neurons.
+        line_text : list, optional
+            Hover text of the connections via each region C. Defaults to hover_text.
+        """
+        if line_text is None:
+            line_text = hover_text
+        num_C = len(list_region_C)
+        x_C = self.SCALE * np.arange(num_C) + 64
+        points_C = np.column_stack([x_C, np.full(num_C, self.MAX_Y / 2)])
+        point_A = np.tile([self.MAX_X / 2, 125], (num_C, 1))
+        point_B = np.tile([self.MAX_X / 2, self.MAX_Y - 125], (num_C, 1))
+
+        # icons, all added at once
+        self.fig.layout.images = self.fig.layout.images + tuple(
+            dict(templateitemname="node_C", x=x, y=y, visible=True) for x, y in points_C.tolist())
+
+        # connections A->C and C->B, as a single line trace with gaps
+        points = geometry.interpolate_segments(np.concatenate([point_A, points_C]),
+                                               np.concatenate([points_C, point_B]))
+        x_all, y_all, text_all = geometry.get_polyline_buffers(points, list(line_text) * 2)
+        self.fig.add_trace(go.Scatter(
+            x=x_all,
+            y=y_all,
+            mode="lines",
+            line_color="#FF0000",
+            showlegend=False,
+            text=text_all,
+            hoverinfo="text",
+        ))
+
+        # node markers and labels
+        self.fig.add_trace(go.Scatter(
+            x=points_C[:, 0],
+            y=points_C[:, 1],
+            mode="markers",
+            marker_symbol="circle",
+            text=hover_text,
+            hoverinfo="text",
+        ))
+        self.fig.add_trace(go.Scatter(
+            x=points_C[:, 0],
+            y=points_C[:, 1] + 100,
+            mode="text",
+            text=list_region_C,
+            textfont=dict(
+                family="Courier New, monospace",
+                size=12,
+                color="#000000"
+            ),
+            hoverinfo="skip",
+        ))
 
     def update_graph(self):
         """
-        Update the layout of the figure.
+        Update the axis ranges of the figure (the remaining layout is set on initialization).
         """
-        self.fig.update_xaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
-        self.fig.update_yaxes(showgrid=False, zeroline=False, visible=False, showticklabels=False)
         self.fig.update_yaxes(range = [self.MAX_Y, 0])
         self.fig.update_xaxes(range = [0, self.MAX_X])
-        self.fig.update_layout(height=int(500))
-        self.fig.update_layout(template="plotly_white")
-        self.fig.update_layout(showlegend=False)
 
     def draw_block_bg(self, x0, y0, x1, y1, opacity, color):
         """
@@ -260,13 +412,17 @@ class BlockVis(object):
 
         Parameters
         ----------
-        icon : PIL.Image.Image
-            Image to be drawn.
+        icon : str or PIL.Image.Image
+            Name of a node icon (e.g. 'node_A'), referenced from the figure
+            template, or an image to be drawn.
         x : int
             X coordinate for placing the image.
         y : int
             Y coordinate for placing the image.
         """
+        if isinstance(icon, str) and icon in self.icons:
+            self.fig.add_layout_image(templateitemname=icon, x=x, y=y, visible=True)
+            return
         self.fig.add_layout_image(
             dict(
                 source=icon,
@@ -379,4 +535,20 @@ class BlockVis(object):
         go.FigureWidget
             The Plotly figure widget.
         """
-        return self.fig
\ No newline at end of file
+        return self.fig
+
+    def get_figure_spec(self, precision=3):
+        """
+        Get a minimized spec of the figure.
+
+        Parameters
+        ----------
+        precision : int, optional
+            Number of decimals kept for coordinates. Defaults to 3.
+
+        Returns
+        -------
+        dict
+            The figure spec, with keys 'data' and 'layout'.
+        """
+        return export.get_compact_figure_spec(self.fig, precision=precision)
@@ -5,8 +5,13 @@ License: Apache License 2.0
 """
 
 import time
+import threading
+import collections
 import diskcache
 
+from . import globals
+from . import tracing
+
 
 class CacheManager(object):
     """
@@ -85,7 +90,10 @@ class CacheManager(object):
         tuple or None
             A tuple containing cached timestamp and data, or None if not found.
         """
-        return self.cache.get(key)
+        with tracing.span("cache_get") as span:
+            data = self.cache.get(key)
+            span.set(cache_hit=data is not None)
+        return data
 
     def cache_data(self, key, data):
         """
@@ -98,7 +106,8 @@ class CacheManager(object):
         data : any
             The data to be cached.
         """
-        self.cache.set(key, (time.time(), data))
+        with tracing.span("cache_set"):
+            self.cache.set(key, (time.time(), data))
 
     def invalidate_old_cache_entries(self):
         """
@@ -109,3 +118,129 @@ class CacheManager(object):
             cached_time, _ = self.cache.get(key)
             if (now - cached_time) > (self.max_cache_days * 86400):
                 self.cache.pop(key)
+
+
+class LRUCache(object):
+    """
+    A class for a bounded in-memory cache, evicting the least recently used entries.
+
+    Safe to be shared between threads, e.g. by all sessions of a web app worker.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries.
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum number of entries.
+    hits : int
+        Number of lookups that found an entry.
+    misses : int
+        Number of lookups that did not find an entry.
+    evictions : int
+        Number of entries removed to respect maxsize.
+
+    Methods
+    -------
+    __init__(maxsize):
+        Initialize the LRUCache class.
+    get_cached_data(key):
+        Retrieve cached data associated with a given key.
+    cache_data(key, data):
+        Cache data with an associated key.
+    clear():
+        Remove all entries.
+    get_stats():
+        Get the usage statistics of the cache.
+    """
+
+    def __init__(self, maxsize=globals.DEFAULT_RESPONSE_CACHE_SIZE):
+        """
+        Initialize LRUCache object.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of entries. Defaults to globals.DEFAULT_RESPONSE_CACHE_SIZE.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize needs to be at least 1!")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_cached_data(self, key):
+        """
+        Get cached data using a specified key, marking it as recently used.
+
+        Parameters
+        ----------
+        key : hashable
+            The cache key, e.g. a tuple.
+
+        Returns
+        -------
+        any
+            The cached data, or None if not found.
+        """
+        with tracing.span("lru_cache_get") as span:
+            with self._lock:
+                data = self._entries.get(key)
+                if data is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+            span.set(cache_hit=data is not None)
+        return data
+
+    def cache_data(self, key, data):
+        """
+        Cache data using a specified key, evicting the least recently used entries if full.
+
+        Parameters
+        ----------
+        key : hashable
+            The cache key, e.g. a tuple.
+        data : any
+            The data to be cached (not None).
+        """
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all entries (the statistics are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """
+        Get the usage statistics of the cache.
+
+        Returns
+        -------
+        dict
+            Dict with the number of entries ('size'), 'maxsize', 'hits',
+            'misses', 'evictions' and the fraction of lookups found ('hit_rate').
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
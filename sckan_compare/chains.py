@@ -0,0 +1,124 @@
+"""
+Neuron chains via forward connections for SckanCompare package.
+
+License: Apache License 2.0
+"""
+
+from collections import deque
+
+from . import globals
+
+
+class ConnectionGraph(object):
+    """
+    A class for traversing forward connections between neurons locally.
+
+    Parameters
+    ----------
+    edges : list
+        List of (neuron_1, neuron_2) pairs, where neuron_1 has a forward
+        connection to neuron_2.
+
+    Attributes
+    ----------
+    adjacency : dict
+        Dict with neuron IRIs as keys and lists of forward connected neuron IRIs as values.
+
+    Methods
+    -------
+    __init__(edges):
+        Initialize the ConnectionGraph class.
+    from_result(result):
+        Create a graph from the result of `query.neuron_forward_connection_query`.
+    get_edges():
+        Get the edge list of the graph.
+    find_chains(start_neurons, target_neurons, max_depth=globals.DEFAULT_MAX_CHAIN_DEPTH, max_chains=None):
+        Find chains of forward connected neurons from start to target neurons.
+    """
+
+    def __init__(self, edges):
+        """
+        Initialize ConnectionGraph object.
+
+        Parameters
+        ----------
+        edges : list
+            List of (neuron_1, neuron_2) pairs, where neuron_1 has a forward
+            connection to neuron_2.
+        """
+        self.adjacency = {}
+        for neuron_1, neuron_2 in edges:
+            self.adjacency.setdefault(neuron_1, []).append(neuron_2)
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        Create a graph from the result of `query.neuron_forward_connection_query`.
+
+        Parameters
+        ----------
+        result : list
+            The query result, with the column names as first row.
+
+        Returns
+        -------
+        ConnectionGraph
+            The graph of forward connections.
+        """
+        return cls((row[0], row[1]) for row in result[1:])
+
+    def get_edges(self):
+        """
+        Get the edge list of the graph.
+
+        Returns
+        -------
+        list
+            List of (neuron_1, neuron_2) pairs.
+        """
+        return [(neuron_1, neuron_2) for neuron_1, targets in self.adjacency.items()
+                for neuron_2 in targets]
+
+    def find_chains(self, start_neurons, target_neurons,
+                    max_depth=globals.DEFAULT_MAX_CHAIN_DEPTH, max_chains=None):
+        """
+        Find chains of forward connected neurons from start to target neurons.
+
+        Uses a breadth-first search, so that chains are returned in order of
+        increasing length. A neuron appears at most once in a chain, so cycles
+        in the forward connections are not followed.
+
+        Parameters
+        ----------
+        start_neurons : iterable
+            IRIs of the neurons a chain may start with.
+        target_neurons : iterable
+            IRIs of the neurons a chain may end with.
+        max_depth : int, optional
+            Maximum number of neurons in a chain. Defaults to globals.DEFAULT_MAX_CHAIN_DEPTH.
+        max_chains : int, optional
+            Maximum number of chains to return. Defaults to None (no limit).
+
+        Returns
+        -------
+        list
+            List of chains, each a tuple of neuron IRIs.
+        """
+        if max_depth < 1:
+            raise ValueError("max_depth needs to be at least 1!")
+        target_neurons = set(target_neurons)
+
+        chains = []
+        queue = deque((neuron,) for neuron in dict.fromkeys(start_neurons))
+        while queue:
+            chain = queue.popleft()
+            if chain[-1] in target_neurons:
+                chains.append(chain)
+                if max_chains and len(chains) >= max_chains:
+                    break
+            if len(chain) >= max_depth:
+                continue
+            for neuron in self.adjacency.get(chain[-1], []):
+                if neuron not in chain:
+                    queue.append(chain + (neuron,))
+        return chains
@@ -0,0 +1,200 @@
+"""
+Species coordinate maps for SckanCompare package.
+
+License: Apache License 2.0
+"""
+
+import os
+import json
+import functools
+import pkg_resources
+import numpy as np
+import pandas as pd
+
+from . import globals
+
+
+class CoordinateMap(object):
+    """
+    A class holding the visual (X,Y) coordinates of the regions of a species.
+
+    Regions can be looked up by label or by IRI; coordinates of many regions
+    are gathered from a NumPy array in a single indexing operation.
+
+    Parameters
+    ----------
+    names : list
+        Labels of the regions.
+    urls : list
+        IRIs of the regions.
+    coords : numpy.ndarray
+        Array of shape (n, 2) with the (X,Y) coordinates of the regions.
+
+    Attributes
+    ----------
+    names : list
+        Labels of the regions.
+    urls : list
+        IRIs of the regions.
+    coords : numpy.ndarray
+        Array of shape (n, 2) with the (X,Y) coordinates of the regions.
+    index : dict
+        Dict with region labels and IRIs as keys and positions in `coords` as values.
+
+    Methods
+    -------
+    __init__(names, urls, coords):
+        Initialize the CoordinateMap class.
+    from_json(filepath):
+        Load a coordinate map from a JSON file.
+    get_indices(regions):
+        Get the positions of regions in the coordinate array.
+    get_coordinates(regions):
+        Get the coordinates of regions.
+    get_region_dict():
+        Get a dict mapping region labels to (X,Y) coordinates.
+    get_region_labels():
+        Get a dict mapping region IRIs to labels.
+    """
+
+    def __init__(self, names, urls, coords):
+        """
+        Initialize CoordinateMap object.
+
+        Parameters
+        ----------
+        names : list
+            Labels of the regions.
+        urls : list
+            IRIs of the regions.
+        coords : numpy.ndarray
+            Array of shape (n, 2) with the (X,Y) coordinates of the regions.
+        """
+        self.names = list(names)
+        self.urls = list(urls)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.coords.setflags(write=False)
+        self.index = {}
+        for idx, (name, url) in enumerate(zip(self.names, self.urls)):
+            self.index[name] = idx
+            self.index[url] = idx
+
+    @classmethod
+    def from_json(cls, filepath):
+        """
+        Load a coordinate map from a JSON file (e.g. coords_human.json).
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the JSON file, with a list of items with keys 'Name', 'URL', 'X' and 'Y'.
+
+        Returns
+        -------
+        CoordinateMap
+            The coordinate map.
+        """
+        with open(filepath, encoding='utf-8-sig') as json_file:
+            data = json.load(json_file)
+        return cls([item["Name"] for item in data],
+                   [item["URL"] for item in data],
+                   [[int(item["X"]), int(item["Y"])] for item in data])
+
+    def get_indices(self, regions):
+        """
+        Get the positions of regions in the coordinate array.
+
+        Parameters
+        ----------
+        regions : array-like
+            Labels or IRIs of the regions (e.g. a DataFrame column).
+            For categorical columns, only the categories are looked up.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of positions; -1 for regions not available in the map.
+        """
+        regions = pd.Series(regions, copy=False)
+        if isinstance(regions.dtype, pd.CategoricalDtype):
+            # look up each category once; missing values (code -1) map to the appended -1
+            category_indices = np.array([self.index.get(region, -1) for region in regions.cat.categories] + [-1],
+                                        dtype=int)
+            return category_indices[regions.cat.codes.to_numpy()]
+        return regions.map(self.index).fillna(-1).to_numpy(dtype=int)
+
+    def get_coordinates(self, regions):
+        """
+        Get the coordinates of regions.
+
+        Parameters
+        ----------
+        regions : array-like
+            Labels or IRIs of the regions (e.g. a DataFrame column).
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (len(regions), 2) with the (X,Y) coordinates.
+
+        Raises
+        ------
+        ValueError
+            If any of the regions is not available in the map.
+        """
+        indices = self.get_indices(regions)
+        if (indices < 0).any():
+            missing = pd.unique(np.asarray(regions, dtype=object)[indices < 0])
+            raise ValueError("Region(s) not available in visual map: {}!".format(", ".join(map(str, missing))))
+        return self.coords[indices]
+
+    def get_region_dict(self):
+        """
+        Get a dict mapping region labels to (X,Y) coordinates.
+
+        Returns
+        -------
+        dict
+            Dict with region labels as keys and [X, Y] lists as values.
+        """
+        region_dict = {}
+        for name, (x, y) in zip(self.names, self.coords.astype(int).tolist()):
+            region_dict[name] = [x, y]
+        return region_dict
+
+    def get_region_labels(self):
+        """
+        Get a dict mapping region IRIs to labels.
+
+        Returns
+        -------
+        dict
+            Dict with region IRIs as keys and labels as values.
+        """
+        return dict(zip(self.urls, self.names))
+
+
+@functools.lru_cache(maxsize=None)
+def get_coordinate_map(species):
+    """
+    Get the coordinate map of a species; loaded only once per process.
+
+    Parameters
+    ----------
+    species : str
+        The species for which to get the map.
+
+    Returns
+    -------
+    CoordinateMap
+        The coordinate map (shared, not to be modified).
+
+    Raises
+    ------
+    ValueError
+        If no map is available for the species.
+    """
+    if species not in globals.AVAILABLE_SPECIES_MAPS.keys():
+        raise ValueError("{} visual map not currently available!".format(species))
+    datapath = pkg_resources.resource_filename("sckan_compare", "data")
+    return CoordinateMap.from_json(os.path.join(datapath, globals.AVAILABLE_SPECIES_MAPS[species]))
@@ -0,0 +1,188 @@
+"""
+Compact figure export for SckanCompare package.
+
+Produces minimized plotly figure specs, e.g. for caching rendered figures:
+coordinates with reduced precision, styles shared by all traces moved into
+the figure template, and the template reduced to the trace types in use.
+The size gain over fig.to_json() is modest for full anatomy maps (about 7%)
+and negligible for BlockVis figures.
+
+License: Apache License 2.0
+"""
+
+import collections
+
+import numpy as np
+import plotly.io as pio
+
+# trace attributes holding coordinates
+COORDINATE_KEYS = ("x", "y")
+
+# trace attributes that are never shared through the template
+TRACE_SPECIFIC_KEYS = ("type", "x", "y", "text", "hovertext", "customdata", "name", "uid")
+
+
+def encode_array(values, precision=3):
+    """
+    Encode an array of coordinates compactly.
+
+    Parameters
+    ----------
+    values : array-like
+        The coordinates; None or NaN values mark gaps.
+    precision : int, optional
+        Number of decimals to keep. Defaults to 3.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of rounded values (NaN for gaps), serialized by plotly in bulk.
+    """
+    return np.round(np.asarray(values, dtype=float), precision)
+
+
+def is_numeric_array(values):
+    """
+    Check if an array only holds numbers (and gaps).
+
+    Parameters
+    ----------
+    values : array-like
+        The array to be checked.
+
+    Returns
+    -------
+    bool
+        True if all values are numbers, None or NaN.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        return True
+    return all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+               for value in values)
+
+
+def is_equal(value1, value2):
+    """
+    Check if two attribute values are equal, without failing on arrays.
+
+    Parameters
+    ----------
+    value1 : any
+        First value.
+    value2 : any
+        Second value.
+
+    Returns
+    -------
+    bool
+        True if the values are equal.
+    """
+    try:
+        return bool(value1 == value2)
+    except ValueError:
+        # element-wise comparison of arrays
+        return False
+
+
+def share_trace_styles(spec):
+    """
+    Move attributes shared by all traces of a type into the figure template.
+
+    Parameters
+    ----------
+    spec : dict
+        The figure spec, modified in place.
+    """
+    traces_by_type = collections.defaultdict(list)
+    for trace in spec.get("data", []):
+        traces_by_type[trace.get("type", "scatter")].append(trace)
+
+    template_data = spec.setdefault("layout", {}).setdefault("template", {}).setdefault("data", {})
+    for trace_type, traces in traces_by_type.items():
+        if len(traces) < 2:
+            continue
+        shared = {}
+        for key, value in traces[0].items():
+            if key in TRACE_SPECIFIC_KEYS:
+                continue
+            if all(key in trace and is_equal(trace[key], value) for trace in traces[1:]):
+                shared[key] = value
+        if not shared:
+            continue
+        # template entries of a type are cycled through its traces, hence only one entry
+        style = dict(template_data.get(trace_type, [{}])[0])
+        style.update(shared)
+        template_data[trace_type] = [style]
+        for trace in traces:
+            for key in shared:
+                del trace[key]
+
+
+def get_compact_figure_spec(fig, precision=3, share_styles=True):
+    """
+    Get a minimized spec of a figure.
+
+    Parameters
+    ----------
+    fig : go.Figure or go.FigureWidget or dict
+        The figure to be exported.
+    precision : int, optional
+        Number of decimals kept for coordinates. Defaults to 3.
+    share_styles : bool, optional
+        Whether to move styles shared by all traces of a type into the
+        template. Defaults to True.
+
+    Returns
+    -------
+    dict
+        The figure spec, with keys 'data' and 'layout'. Nested values not
+        changed by the export are shared with the figure, hence the spec
+        should not be modified in place.
+    """
+    if isinstance(fig, dict):
+        spec = fig
+    else:
+        # shallow copies of the validated properties, rather than the deep copy of fig.to_plotly_json()
+        spec = {"data": fig._data, "layout": fig._layout}
+    spec = {"data": [dict(trace) for trace in spec.get("data", [])],
+            "layout": dict(spec.get("layout", {}))}
+
+    for trace in spec["data"]:
+        for key in COORDINATE_KEYS:
+            if key in trace and is_numeric_array(trace[key]):
+                trace[key] = encode_array(trace[key], precision)
+
+    # keep template trace defaults only for the trace types in use
+    template = dict(spec["layout"].get("template", {}))
+    if "data" in template:
+        trace_types = {trace.get("type", "scatter") for trace in spec["data"]}
+        template["data"] = {trace_type: styles for trace_type, styles in template["data"].items()
+                            if trace_type in trace_types}
+    spec["layout"]["template"] = template
+
+    if share_styles:
+        share_trace_styles(spec)
+    return spec
+
+
+def to_compact_json(fig, precision=3, share_styles=True):
+    """
+    Serialize a figure to a minimized JSON string.
+
+    Parameters
+    ----------
+    fig : go.Figure or go.FigureWidget or dict
+        The figure to be exported.
+    precision : int, optional
+        Number of decimals kept for coordinates. Defaults to 3.
+    share_styles : bool, optional
+        Whether to move styles shared by all traces of a type into the
+        template. Defaults to True.
+
+    Returns
+    -------
+    str
+        The figure spec as JSON string.
+    """
+    spec = get_compact_figure_spec(fig, precision, share_styles)
+    return pio.to_json(spec, validate=False, pretty=False)
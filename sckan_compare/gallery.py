@@ -0,0 +1,188 @@
+"""
+Block diagram galleries for SckanCompare package.
+
+Renders the block visualization of many (Region_A, Region_B) pairs of a
+species table, optionally across a process pool, and writes them to a single
+HTML page in which plotly.js, the layout template and the node icons are
+embedded only once.
+
+License: Apache License 2.0
+"""
+
+import html
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.io as pio
+import plotly.offline
+
+from . import export
+from .blockvis import BlockVis
+
+# read-only species table shared with the worker processes
+_shared_table = None
+
+
+def _init_worker(df):
+    """
+    Initialize a worker process with the shared species table.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The species table.
+    """
+    global _shared_table
+    _shared_table = df
+
+
+def get_region_pairs(df, min_count=1):
+    """
+    Get all (Region_A, Region_B) pairs of a species table.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The species table (e.g. from `SckanCompare.get_filtered_dataframe`).
+    min_count : int, optional
+        Minimum number of neurons of a pair. Defaults to 1.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per pair with columns 'Region_A', 'Region_B' and 'Neurons'
+        (number of neurons), sorted by descending number of neurons.
+    """
+    pairs = df.dropna(subset=["Region_A", "Region_B"]).groupby(
+        ["Region_A", "Region_B"], observed=True)["Neuron_IRI"].nunique()
+    pairs = pairs[pairs >= min_count].rename("Neurons").reset_index()
+    return pairs.sort_values("Neurons", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def plot_block_figure(region_A, region_B, df=None, precision=3):
+    """
+    Plot the block visualization of a pair, as a compact figure spec.
+
+    Parameters
+    ----------
+    region_A : str
+        Name of region A.
+    region_B : str
+        Name of region B.
+    df : pandas.DataFrame, optional
+        The species table. Defaults to the table shared with the worker process.
+    precision : int, optional
+        Number of decimals kept for coordinates. Defaults to 3.
+
+    Returns
+    -------
+    dict
+        The figure spec, with keys 'data' and 'layout'.
+    """
+    if df is None:
+        df = _shared_table
+    vis = BlockVis(widget=False)
+    vis.plot_figure(df, region_A, region_B)
+    # styles are not moved into the template, so that all figures share the same template
+    return export.get_compact_figure_spec(vis.fig, precision=precision, share_styles=False)
+
+
+def _plot_pair(pair):
+    """
+    Plot the block visualization of a pair in a worker process.
+    """
+    return plot_block_figure(pair[0], pair[1])
+
+
+def get_block_gallery(df, pairs=None, max_workers=None, chunksize=8):
+    """
+    Plot the block visualizations of many pairs of a species table.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The species table (e.g. from `SckanCompare.get_filtered_dataframe`).
+    pairs : list, optional
+        List of (Region_A, Region_B) tuples. Defaults to all pairs of the table.
+    max_workers : int, optional
+        Number of worker processes; the pairs are plotted in the current
+        process if None or 1. Defaults to None.
+    chunksize : int, optional
+        Number of pairs sent to a worker process at once. Defaults to 8.
+
+    Returns
+    -------
+    dict
+        Dict with (Region_A, Region_B) tuples as keys and figure specs as values,
+        in the order of the pairs; use go.Figure(spec) to display a figure.
+    """
+    if pairs is None:
+        pairs = get_region_pairs(df)[["Region_A", "Region_B"]].itertuples(index=False, name=None)
+    pairs = [tuple(pair) for pair in pairs]
+
+    if max_workers is None or max_workers <= 1:
+        specs = [plot_block_figure(region_A, region_B, df) for region_A, region_B in pairs]
+    else:
+        # the table is sent once to each worker, instead of with each pair
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_worker,
+                                 initargs=(df,)) as executor:
+            specs = list(executor.map(_plot_pair, pairs, chunksize=chunksize))
+    return dict(zip(pairs, specs))
+
+
+def write_block_gallery(gallery, filepath, title="Block diagrams", include_plotlyjs="cdn"):
+    """
+    Write a gallery of block visualizations to a single HTML page.
+
+    plotly.js and the layout template (incl. the node icons) are embedded
+    only once, and shared by all figures of the page.
+
+    Parameters
+    ----------
+    gallery : dict
+        Dict with (Region_A, Region_B) tuples as keys and figure specs as
+        values (e.g. from `get_block_gallery`).
+    filepath : str
+        Path of the HTML file.
+    title : str, optional
+        Title of the page.
+    include_plotlyjs : str or bool, optional
+        'cdn' to load plotly.js from the CDN, True to embed it. Defaults to 'cdn'.
+    """
+    if include_plotlyjs == "cdn":
+        plotlyjs = '<script src="https://cdn.plot.ly/plotly-{}.min.js"></script>'.format(
+            plotly.offline.get_plotlyjs_version())
+    elif include_plotlyjs is True:
+        plotlyjs = '<script type="text/javascript">{}</script>'.format(plotly.offline.get_plotlyjs())
+    else:
+        raise ValueError("Invalid include_plotlyjs specified: {}!".format(include_plotlyjs))
+
+    template = {}
+    figures = []
+    for (region_A, region_B), spec in gallery.items():
+        layout = dict(spec["layout"])
+        template = layout.pop("template", template)
+        figures.append((region_A, region_B, {"data": spec["data"], "layout": layout}))
+
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8"/><title>{}</title>'.format(html.escape(title)),
+        plotlyjs,
+        "</head><body>",
+        "<h1>{}</h1>".format(html.escape(title)),
+        '<script type="text/javascript">var template = {};</script>'.format(
+            pio.json.to_json_plotly(template)),
+    ]
+    for idx, (region_A, region_B, spec) in enumerate(figures):
+        parts.append("<h2>{} &rarr; {}</h2>".format(html.escape(str(region_A)), html.escape(str(region_B))))
+        parts.append('<div id="block-{}"></div>'.format(idx))
+        parts.append(
+            '<script type="text/javascript">'
+            'var spec = {spec}; spec.layout.template = template;'
+            'Plotly.newPlot("block-{idx}", spec.data, spec.layout, {{"displaylogo": false}});'
+            '</script>'.format(spec=pio.json.to_json_plotly(spec), idx=idx))
+    parts.append("</body></html>")
+
+    with open(filepath, "w", encoding="utf-8") as html_file:
+        html_file.write("\n".join(parts))
+
@@ -0,0 +1,84 @@
+"""
+Edge geometry for SckanCompare package visualizations.
+
+License: Apache License 2.0
+"""
+
+import numpy as np
+
+
+def interpolate_coordinates(point1, point2, resolution=0.1):
+    """
+    Interpolate between two cartesian coordinates with a given resolution using NumPy.
+
+    Parameters
+    ----------
+    point1 : tuple
+        First cartesian coordinate (x1, y1).
+    point2 : tuple
+        Second cartesian coordinate (x2, y2).
+    resolution : float, optional
+        Interpolation resolution.
+
+    Returns
+    -------
+    tuple
+        Two lists of interpolated x and y coordinates.
+    """
+    points = interpolate_segments(np.array([point1], dtype=float),
+                                  np.array([point2], dtype=float), resolution)
+    return list(points[0, :, 0]), list(points[0, :, 1])
+
+
+def interpolate_segments(start, end, resolution=0.1):
+    """
+    Interpolate between the start and end coordinates of many segments at once.
+
+    Parameters
+    ----------
+    start : numpy.ndarray
+        Array of shape (n, 2) with the start coordinates (x, y) of each segment.
+    end : numpy.ndarray
+        Array of shape (n, 2) with the end coordinates (x, y) of each segment.
+    resolution : float, optional
+        Interpolation resolution.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (n, int(1 / resolution) + 1, 2) with the interpolated
+        coordinates of each segment.
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    num_steps = int(1 / resolution)
+    t = np.linspace(0, 1, num_steps + 1)
+    return start[:, None, :] + (end - start)[:, None, :] * t[None, :, None]
+
+
+def get_polyline_buffers(points, labels=None):
+    """
+    Flatten segment coordinates into buffers for a single line trace.
+
+    Consecutive segments are separated by a NaN point, which plotly renders as a gap.
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        Array of shape (n, k, 2) with the coordinates of n segments of k points each.
+    labels : array-like, optional
+        Label of each of the n segments, e.g. used as hover text.
+
+    Returns
+    -------
+    tuple
+        Arrays of x and y coordinates of shape (n * (k + 1),), and the array of
+        labels for each point (or None if labels is None).
+    """
+    num_segments, num_points, _ = points.shape
+    gaps = np.full((num_segments, 1, 2), np.nan)
+    buffer = np.concatenate([points, gaps], axis=1).reshape(-1, 2)
+    point_labels = None
+    if labels is not None:
+        point_labels = np.repeat(np.asarray(labels, dtype=object), num_points + 1)
+    return buffer[:, 0], buffer[:, 1], point_labels
@@ -38,4 +38,30 @@ DUPLICATE_SPECIES_RESOLVER = {
     "house mouse": "Mus musculus",
     "vertebrates": "Vertebrata",
     "Vertebrata <vertebrates>": "Vertebrata",
-}
\ No newline at end of file
+}
+
+# Maximum number of neurons re-queried per request during a delta refresh
+DELTA_QUERY_BATCH_SIZE = 100
+
+# Default maximum number of neurons in a chain of forward connections
+DEFAULT_MAX_CHAIN_DEPTH = 5
+
+# Default maximum number of entries in the in-memory response cache of the web app
+DEFAULT_RESPONSE_CACHE_SIZE = 256
+
+# Seconds between attempts to load data in the background, after a failure
+LOADER_RETRY_SECONDS = 30
+
+# Number of snapshots kept in a snapshot directory: the current one, and
+# previous ones that workers may still be loading
+SNAPSHOT_KEEP = 2
+
+# Names of the traced stages (spans) in memory profiles; other spans keep their own names
+MEMORY_PROFILE_STAGES = {
+    "sparql_request": "response_text",
+    "csv_parse": "csv_rows",
+    "get_dataframe": "dataframe",
+    "get_filtered_dataframe": "normalized_frame",
+    "anatomy_plot": "figure",
+    "block_plot": "figure",
+}
@@ -0,0 +1,202 @@
+"""
+Background data loading for SckanCompare package.
+
+Loads data (e.g. a SckanCompare object with its pathway store) in a
+background thread, so that a web app can start serving immediately, and
+refreshes it periodically without a restart.
+
+Example::
+
+    def load():
+        sc = SckanCompare()
+        sc.refresh_pathway_store()
+        return sc
+
+    def refresh(sc):
+        sc.refresh_pathway_store()
+        return sc
+
+    loader = BackgroundLoader(load, refresh=refresh, refresh_interval=3600)
+    loader.start()
+    ...
+    if loader.is_ready():
+        sc = loader.get_data()
+
+License: Apache License 2.0
+"""
+
+import logging
+import threading
+
+from . import globals
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoader(object):
+    """
+    A class for loading data in a background thread, and refreshing it periodically.
+
+    Readers always get a complete dataset: new data is swapped in with a
+    single assignment once it is fully loaded. If loading fails, it is
+    retried; if a refresh fails, the current data is kept.
+
+    Parameters
+    ----------
+    load : callable
+        Function without arguments returning the data.
+    refresh : callable, optional
+        Function accepting the current data and returning the refreshed data.
+        Defaults to calling `load` again.
+    refresh_interval : float, optional
+        Seconds between refreshes; no refreshes if None. Defaults to None.
+    retry_interval : float, optional
+        Seconds between attempts to load the data initially.
+        Defaults to globals.LOADER_RETRY_SECONDS.
+
+    Attributes
+    ----------
+    data : any
+        The current data; None until loaded.
+    version : int
+        Number of times data was swapped in.
+    error : Exception
+        The error of the last failed attempt, or None.
+    ready : threading.Event
+        Set once the data is loaded.
+
+    Methods
+    -------
+    __init__(load, refresh=None, refresh_interval=None, retry_interval=globals.LOADER_RETRY_SECONDS):
+        Initialize the BackgroundLoader class.
+    start():
+        Start loading the data in a background thread.
+    stop():
+        Stop refreshing the data.
+    is_ready():
+        Check if the data is loaded.
+    wait(timeout=None):
+        Wait until the data is loaded.
+    get_data():
+        Get the current data.
+    """
+
+    def __init__(self, load, refresh=None, refresh_interval=None, retry_interval=globals.LOADER_RETRY_SECONDS):
+        """
+        Initialize BackgroundLoader object.
+
+        Parameters
+        ----------
+        load : callable
+            Function without arguments returning the data.
+        refresh : callable, optional
+            Function accepting the current data and returning the refreshed data.
+        refresh_interval : float, optional
+            Seconds between refreshes; no refreshes if None.
+        retry_interval : float, optional
+            Seconds between attempts to load the data initially.
+        """
+        self.load = load
+        self.refresh = refresh if refresh is not None else (lambda data: load())
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.data = None
+        self.version = 0
+        self.error = None
+        self.ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start loading the data in a background (daemon) thread.
+
+        Returns
+        -------
+        BackgroundLoader
+            The loader itself.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sckan-compare-loader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop loading or refreshing the data; the current data is kept.
+        """
+        self._stopped.set()
+
+    def is_ready(self):
+        """
+        Check if the data is loaded.
+
+        Returns
+        -------
+        bool
+            True once the data is loaded.
+        """
+        return self.ready.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Wait until the data is loaded.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait. Defaults to no limit.
+
+        Returns
+        -------
+        bool
+            True if the data is loaded.
+        """
+        return self.ready.wait(timeout)
+
+    def get_data(self):
+        """
+        Get the current data.
+
+        Returns
+        -------
+        any
+            The current data, or None if not loaded yet.
+        """
+        return self.data
+
+    def _swap(self, data):
+        """
+        Swap in new data.
+        """
+        self.data = data
+        self.version += 1
+        self.error = None
+        self.ready.set()
+
+    def _run(self):
+        """
+        Load the data, and refresh it periodically until stopped.
+        """
+        while not self._stopped.is_set():
+            try:
+                with tracing.span("background_load"):
+                    data = self.load()
+                self._swap(data)
+                break
+            except Exception as error:
+                self.error = error
+                logger.exception("Loading data failed; retrying in %s seconds", self.retry_interval)
+                self._stopped.wait(self.retry_interval)
+
+        if self.refresh_interval is None:
+            return
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                with tracing.span("background_refresh"):
+                    data = self.refresh(self.data)
+                self._swap(data)
+            except Exception as error:
+                self.error = error
+                logger.exception("Refreshing data failed; keeping the current data")
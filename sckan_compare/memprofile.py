@@ -0,0 +1,236 @@
+"""
+Memory profiling of processing stages for SckanCompare package.
+
+Records the peak and retained allocations of the traced stages (see
+`tracing`) with tracemalloc, and checks them against per-stage budgets.
+Profiling is opt-in, as tracemalloc slows down allocations considerably.
+
+The main stages of a query are recorded under the names of
+globals.MEMORY_PROFILE_STAGES: 'response_text', 'csv_rows', 'dataframe',
+'normalized_frame' and 'figure'; other spans under their own names.
+
+Example::
+
+    profiler = MemoryProfiler(budgets={"normalized_frame": 200, "figure": 50}, on_exceed="raise")
+    with profiler:
+        df = sc.get_filtered_dataframe(sc.execute_query(query.neuron_path_all_species_query), "Homo sapiens")
+    profiler.get_report()
+
+Note that tracemalloc measures all allocations of the process: stages
+running concurrently in several threads are not told apart.
+
+License: Apache License 2.0
+"""
+
+import warnings
+import threading
+import tracemalloc
+
+import pandas as pd
+
+from . import globals
+from . import tracing
+
+# actions when a stage exceeds its budget
+ON_EXCEED_ACTIONS = ("warn", "raise")
+
+
+class MemoryProfiler(object):
+    """
+    A class recording the peak and retained allocations of traced stages.
+
+    The peak of a stage is the maximum of the memory allocated during the
+    stage, relative to the memory allocated at its start; the retained
+    memory is what is still allocated at its end (e.g. its result).
+    Nested stages (e.g. 'dataframe' within 'normalized_frame') are each
+    measured in full.
+
+    Parameters
+    ----------
+    budgets : dict, optional
+        Dict with stage names as keys and budgets as values: either the
+        maximum peak in MB, or a dict with keys 'peak' and/or 'retained' (MB).
+        Defaults to no budgets.
+    on_exceed : str, optional
+        'warn' to issue a RuntimeWarning, or 'raise' to raise a MemoryError
+        when a stage exceeds its budget. Defaults to 'warn'.
+
+    Attributes
+    ----------
+    budgets : dict
+        Dict with stage names as keys and dicts with keys 'peak' and 'retained' (MB) as values.
+    on_exceed : str
+        Action when a stage exceeds its budget.
+    stats : dict
+        Dict with stage names as keys and dicts with the statistics of the stage as values.
+
+    Methods
+    -------
+    __init__(budgets=None, on_exceed="warn"):
+        Initialize the MemoryProfiler class.
+    start():
+        Start recording the stages.
+    stop():
+        Stop recording the stages.
+    reset():
+        Clear the recorded statistics.
+    get_report():
+        Get the recorded statistics of each stage.
+    """
+
+    def __init__(self, budgets=None, on_exceed="warn"):
+        """
+        Initialize MemoryProfiler object.
+
+        Parameters
+        ----------
+        budgets : dict, optional
+            Dict with stage names as keys and budgets (MB) as values.
+        on_exceed : str, optional
+            'warn' or 'raise' when a stage exceeds its budget.
+        """
+        if on_exceed not in ON_EXCEED_ACTIONS:
+            raise ValueError("Invalid on_exceed specified: {}!".format(on_exceed))
+        self.budgets = {}
+        for stage, budget in (budgets or {}).items():
+            if not isinstance(budget, dict):
+                budget = {"peak": budget}
+            self.budgets[stage] = {"peak": budget.get("peak"), "retained": budget.get("retained")}
+        self.on_exceed = on_exceed
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+        self._active = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Start recording the stages (and tracemalloc, if not yet tracing).
+
+        Returns
+        -------
+        MemoryProfiler
+            The profiler itself.
+        """
+        if self._active:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracing.add_hook(self._on_start, event="start")
+        tracing.add_hook(self._on_end, event="end")
+        self._active = True
+        return self
+
+    def stop(self):
+        """
+        Stop recording the stages (and tracemalloc, if started by the profiler).
+        """
+        if not self._active:
+            return
+        tracing.remove_hook(self._on_start, event="start")
+        tracing.remove_hook(self._on_end, event="end")
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self._active = False
+
+    def reset(self):
+        """
+        Clear the recorded statistics.
+        """
+        with self._lock:
+            self.stats.clear()
+
+    def _get_stack(self):
+        """
+        Get the stages running in the current thread, innermost last.
+        """
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _on_start(self, span):
+        """
+        Record the allocated memory at the start of a stage.
+        """
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        stack = self._get_stack()
+        if stack:
+            # the peak of the enclosing stage so far, before the peak is reset for this stage
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        stack.append({"span": span, "start": current, "peak": current})
+
+    def _on_end(self, span):
+        """
+        Record the peak and retained memory of a stage, and check its budget.
+        """
+        stack = self._get_stack()
+        if not stack or stack[-1]["span"] is not span or not tracemalloc.is_tracing():
+            return
+        frame = stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(frame["peak"], peak)
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        peak_mb = (peak - frame["start"]) / 2**20
+        retained_mb = max(current - frame["start"], 0) / 2**20
+
+        stage = globals.MEMORY_PROFILE_STAGES.get(span.name, span.name)
+        budget = self.budgets.get(stage, {})
+        exceeded = [(kind, value_mb, budget[kind]) for kind, value_mb in (("peak", peak_mb), ("retained", retained_mb))
+                    if budget.get(kind) is not None and value_mb > budget[kind]]
+        with self._lock:
+            stats = self.stats.setdefault(stage, {"count": 0, "peak_mb": 0.0, "retained_mb": 0.0,
+                                                  "last_peak_mb": 0.0, "last_retained_mb": 0.0, "exceeded": 0})
+            stats["count"] += 1
+            stats["peak_mb"] = max(stats["peak_mb"], peak_mb)
+            stats["retained_mb"] = max(stats["retained_mb"], retained_mb)
+            stats["last_peak_mb"] = peak_mb
+            stats["last_retained_mb"] = retained_mb
+            stats["exceeded"] += bool(exceeded)
+
+        if exceeded:
+            message = "Memory budget exceeded in stage {}: {}!".format(stage, ", ".join(
+                "{} {:.1f} MB > {:.1f} MB".format(kind, value_mb, budget_mb) for kind, value_mb, budget_mb in exceeded))
+            if self.on_exceed == "raise":
+                raise MemoryError(message)
+            warnings.warn(message, RuntimeWarning, stacklevel=2)
+
+    def get_report(self):
+        """
+        Get the recorded statistics of each stage.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame indexed by stage, with the number of runs ('Count'), the
+            maximum and last peak and retained memory in MB ('Peak_MB',
+            'Retained_MB', 'Last_peak_MB', 'Last_retained_MB'), the budgets
+            ('Peak_budget_MB', 'Retained_budget_MB') and the number of runs
+            exceeding them ('Exceeded').
+        """
+        report = {}
+        with self._lock:
+            for stage, stats in self.stats.items():
+                budget = self.budgets.get(stage, {})
+                report[stage] = {
+                    "Count": stats["count"],
+                    "Peak_MB": stats["peak_mb"],
+                    "Retained_MB": stats["retained_mb"],
+                    "Last_peak_MB": stats["last_peak_mb"],
+                    "Last_retained_MB": stats["last_retained_mb"],
+                    "Peak_budget_MB": budget.get("peak"),
+                    "Retained_budget_MB": budget.get("retained"),
+                    "Exceeded": stats["exceeded"],
+                }
+        return pd.DataFrame.from_dict(report, orient="index")
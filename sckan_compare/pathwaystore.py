@@ -0,0 +1,274 @@
+"""
+Local pathway store for SckanCompare package.
+
+License: Apache License 2.0
+"""
+
+import hashlib
+
+
+def compute_fingerprint(neuron_label, locations):
+    """
+    Compute the fingerprint of a neuron from its label and locations.
+
+    Only the neuron label and the location IRIs are hashed: changes of the
+    labels of regions or species alone are not detected, and require a full
+    (non-delta) refresh.
+
+    Parameters
+    ----------
+    neuron_label : str
+        The label of the neuron.
+    locations : str
+        Space separated location keys of the neuron (in any order),
+        as returned by `query.neuron_fingerprint_query`.
+
+    Returns
+    -------
+    str
+        Hex digest identifying the current state of the neuron.
+    """
+    key = "\n".join([neuron_label] + sorted(locations.split()))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def get_fingerprints(data):
+    """
+    Convert the result of `query.neuron_fingerprint_query` to fingerprints.
+
+    Parameters
+    ----------
+    data : list
+        The query result.
+
+    Returns
+    -------
+    dict
+        Dict with neuron IRIs as keys and fingerprints as values.
+    """
+    fingerprints = {}
+    for neuron_iri, neuron_label, locations in data[1:]:
+        fingerprints[neuron_iri] = compute_fingerprint(neuron_label, locations)
+    return fingerprints
+
+
+class PathwayStore(object):
+    """
+    A class for storing the neuron pathway data locally, indexed by neuron.
+
+    The store holds the rows of `query.neuron_path_all_species_query` grouped
+    by neuron IRI, along with a fingerprint per neuron. This allows the store
+    to be patched with only the neurons that changed in the data source.
+
+    Parameters
+    ----------
+    header : list
+        Column names of the pathway data.
+    rows_by_neuron : dict, optional
+        Dict with neuron IRIs as keys and lists of rows as values.
+    fingerprints : dict, optional
+        Dict with neuron IRIs as keys and fingerprints as values.
+    version : int, optional
+        Version of the data held in the store.
+
+    Attributes
+    ----------
+    header : list
+        Column names of the pathway data.
+    rows_by_neuron : dict
+        Dict with neuron IRIs as keys and lists of rows as values.
+    fingerprints : dict
+        Dict with neuron IRIs as keys and fingerprints as values.
+    version : int
+        Version of the data; incremented every time the store is patched.
+
+    Methods
+    -------
+    __init__(header, rows_by_neuron=None, fingerprints=None, version=0):
+        Initialize the PathwayStore class.
+    from_result(result, fingerprints=None):
+        Create a store from a query result.
+    to_result():
+        Get the stored data in the format of a query result.
+    get_changed_neurons(fingerprints):
+        Identify the neurons that differ from the given fingerprints.
+    apply_delta(result, fingerprints):
+        Patch the store with the rows of changed neurons.
+    copy():
+        Get a copy of the store, which can be patched independently.
+    to_dict():
+        Get a dict representation of the store, e.g. for caching.
+    from_dict(data):
+        Create a store from its dict representation.
+    """
+
+    def __init__(self, header, rows_by_neuron=None, fingerprints=None, version=0):
+        """
+        Initialize PathwayStore object.
+
+        Parameters
+        ----------
+        header : list
+            Column names of the pathway data.
+        rows_by_neuron : dict, optional
+            Dict with neuron IRIs as keys and lists of rows as values.
+        fingerprints : dict, optional
+            Dict with neuron IRIs as keys and fingerprints as values.
+        version : int, optional
+            Version of the data held in the store. Defaults to 0.
+        """
+        self.header = list(header)
+        self.rows_by_neuron = rows_by_neuron if rows_by_neuron is not None else {}
+        self.fingerprints = fingerprints if fingerprints is not None else {}
+        self.version = version
+
+    @staticmethod
+    def group_rows(result):
+        """
+        Group the rows of a query result by neuron IRI (first column).
+
+        Parameters
+        ----------
+        result : list
+            The query result, with the column names as first row.
+
+        Returns
+        -------
+        dict
+            Dict with neuron IRIs as keys and lists of rows as values.
+        """
+        rows_by_neuron = {}
+        for row in result[1:]:
+            rows_by_neuron.setdefault(row[0], []).append(row)
+        return rows_by_neuron
+
+    @classmethod
+    def from_result(cls, result, fingerprints=None):
+        """
+        Create a store from a query result.
+
+        Parameters
+        ----------
+        result : list
+            The query result (e.g. of `query.neuron_path_all_species_query`).
+        fingerprints : dict, optional
+            Dict with neuron IRIs as keys and fingerprints as values.
+
+        Returns
+        -------
+        PathwayStore
+            The new store.
+        """
+        return cls(result[0], cls.group_rows(result), fingerprints)
+
+    def to_result(self):
+        """
+        Get the stored data in the format of a query result.
+
+        Returns
+        -------
+        list
+            List of rows, with the column names as first row, ordered by neuron IRI.
+        """
+        result = [list(self.header)]
+        for neuron_iri in sorted(self.rows_by_neuron):
+            result.extend(self.rows_by_neuron[neuron_iri])
+        return result
+
+    def get_changed_neurons(self, fingerprints):
+        """
+        Identify the neurons that differ from the given fingerprints.
+
+        Parameters
+        ----------
+        fingerprints : dict
+            Dict with neuron IRIs as keys and current fingerprints as values.
+
+        Returns
+        -------
+        tuple
+            List of changed or new neuron IRIs, and list of removed neuron IRIs.
+        """
+        changed = [neuron_iri for neuron_iri, fingerprint in fingerprints.items()
+                   if self.fingerprints.get(neuron_iri) != fingerprint]
+        removed = [neuron_iri for neuron_iri in self.fingerprints
+                   if neuron_iri not in fingerprints]
+        return changed, removed
+
+    def apply_delta(self, result, fingerprints):
+        """
+        Patch the store in place with the rows of changed neurons.
+
+        Parameters
+        ----------
+        result : list
+            Query result containing all rows of the changed or new neurons.
+        fingerprints : dict
+            Dict with neuron IRIs as keys and current fingerprints as values.
+
+        Returns
+        -------
+        tuple
+            List of changed or new neuron IRIs, and list of removed neuron IRIs.
+        """
+        changed, removed = self.get_changed_neurons(fingerprints)
+        new_rows = self.group_rows(result)
+        for neuron_iri in removed:
+            self.rows_by_neuron.pop(neuron_iri, None)
+        for neuron_iri in changed:
+            # neurons without a complete A->C->B path have no rows
+            if neuron_iri in new_rows:
+                self.rows_by_neuron[neuron_iri] = new_rows[neuron_iri]
+            else:
+                self.rows_by_neuron.pop(neuron_iri, None)
+        self.fingerprints = dict(fingerprints)
+        if changed or removed:
+            self.version += 1
+        return changed, removed
+
+    def copy(self):
+        """
+        Get a copy of the store, which can be patched independently.
+
+        Rows are shared with the original, as patching replaces them rather
+        than modifying them.
+
+        Returns
+        -------
+        PathwayStore
+            The copy of the store.
+        """
+        return PathwayStore(self.header, dict(self.rows_by_neuron), dict(self.fingerprints), self.version)
+
+    def to_dict(self):
+        """
+        Get a dict representation of the store, e.g. for caching.
+
+        Returns
+        -------
+        dict
+            Dict with the header, rows, fingerprints and version of the store.
+        """
+        return {
+            "header": self.header,
+            "rows_by_neuron": self.rows_by_neuron,
+            "fingerprints": self.fingerprints,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a store from its dict representation.
+
+        Parameters
+        ----------
+        data : dict
+            Dict as returned by `to_dict()`.
+
+        Returns
+        -------
+        PathwayStore
+            The store.
+        """
+        return cls(data["header"], data["rows_by_neuron"], data["fingerprints"], data["version"])
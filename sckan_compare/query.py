@@ -9,6 +9,8 @@ import csv
 import requests
 from urllib.parse import quote as url_quote
 
+from . import tracing
+
 def procq(res):
     _, (str_count,) = res
     return int(str_count)
@@ -17,8 +19,14 @@ def sparql_query(query, *, endpoint, **kwargs):
     qq = url_quote(query, safe='')
     url = f'{endpoint}?query={qq}'
     headers = {'Accept': 'text/csv'}
-    resp = requests.get(url, headers=headers)
-    return list(csv.reader(io.StringIO(resp.text)))
+    with tracing.span("sparql_request") as span:
+        resp = requests.get(url, headers=headers)
+        text = resp.text
+        span.set(bytes=len(resp.content))
+    with tracing.span("csv_parse") as span:
+        rows = list(csv.reader(io.StringIO(text)))
+        span.set(rows=max(len(rows) - 1, 0))
+    return rows
 
 
 example_query_specify_species = """
@@ -390,8 +398,6 @@ PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
 SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C ?Species ?Species_link ?Phenotype_link ?Phenotype
 {{
 
-    ?Neuron_IRI rdfs:label ?Neuron_Label.
-
     ?Neuron_IRI rdfs:label ?Neuron_Label;
                     ilxtr:hasSomaLocation ?A;
                     ilxtr:hasAxonLocation ?C;
@@ -422,8 +428,6 @@ PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
 SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C ?Species ?Species_link ?Phenotype_link ?Phenotype
 {{
 
-    ?Neuron_IRI rdfs:label ?Neuron_Label.
-
     ?Neuron_IRI rdfs:label ?Neuron_Label;
                     ilxtr:hasSomaLocation ?A;
                     ilxtr:hasAxonLocation ?C;
@@ -452,8 +456,6 @@ PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
 SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C ?Species ?Species_link ?Phenotype_link ?Phenotype
 {{
 
-    ?Neuron_IRI rdfs:label ?Neuron_Label.
-
     ?Neuron_IRI rdfs:label ?Neuron_Label;
                     ilxtr:hasSomaLocation ?A;
                     ilxtr:hasAxonLocation ?C;
@@ -484,8 +486,6 @@ PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
 SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C ?Species ?Species_link ?Phenotype_link ?Phenotype
 {{
 
-    ?Neuron_IRI rdfs:label ?Neuron_Label.
-
     ?Neuron_IRI rdfs:label ?Neuron_Label;
                     ilxtr:hasSomaLocation ?A;
                     ilxtr:hasAxonLocation ?C;
@@ -503,7 +503,35 @@ SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C
 ORDER BY ?Phenotype_link ?Phenotype
 """
 
+# Lightweight neuron to phenotype (IRI) pairs; joined locally with the path table
+# Labels are available via combined_phenotypes_all_species_query
+neuron_phenotype_pairs_query = """
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+
+SELECT DISTINCT ?Neuron_IRI ?Phenotype_link
+{
+    ?Neuron_IRI ilxtr:hasNeuronalPhenotype ?Phenotype_link.
+}
+ORDER BY ?Neuron_IRI ?Phenotype_link
+"""
+
+# Lightweight neuron to circuit role (IRI) pairs; joined locally with the path table
+# Labels are available via combined_circuit_role_phenotypes_all_species_query
+neuron_circuit_role_pairs_query = """
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+
+SELECT DISTINCT ?Neuron_IRI ?Phenotype_link
+{
+    ?Neuron_IRI ilxtr:hasCircuitRole ?Phenotype_link.
+}
+ORDER BY ?Neuron_IRI ?Phenotype_link
+"""
+
 projection_fibres_query = """
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#>
+
 SELECT DISTINCT ?Neuron_1_IRI ?Neuron_1_Label
                 ?Neuron_2_IRI ?Neuron_2_Label ?Species
 WHERE
@@ -512,9 +540,9 @@ WHERE
                 (ilxtr:hasAxonTerminalLocation | ilxtr:hasAxonSensoryLocation) ?Neuron_1_B .
 
     ?Neuron_2_IRI ilxtr:hasSomaLocation ?Neuron_2_A;
-                (ilxtr:hasAxonTerminalLocation | ilxtr:hasAxonSensoryLocation) ??Neuron_2_B .
+                (ilxtr:hasAxonTerminalLocation | ilxtr:hasAxonSensoryLocation) ?Neuron_2_B .
 
-    ?Neuron_IRI ilxtr:isObservedInSpecies ?Species_link.
+    ?Neuron_1_IRI ilxtr:isObservedInSpecies ?Species_link.
     ?Neuron_1_IRI ilxtr:hasForwardConnection ?Neuron_2_IRI .
 
     ?Neuron_1_IRI rdfs:label ?Neuron_1_Label .
@@ -522,6 +550,18 @@ WHERE
 
     ?Species_link (rdfs:label | oboInOwl:hasExactSynonym) ?Species.
 }
+ORDER BY ?Neuron_1_IRI ?Neuron_2_IRI ?Species
+"""
+
+# Edge list of forward connections between neurons; chains are computed locally (see chains)
+neuron_forward_connection_query = """
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+
+SELECT DISTINCT ?Neuron_1_IRI ?Neuron_2_IRI
+{
+    ?Neuron_1_IRI ilxtr:hasForwardConnection ?Neuron_2_IRI.
+}
+ORDER BY ?Neuron_1_IRI ?Neuron_2_IRI
 """
 
 app_query = """
@@ -550,4 +590,50 @@ SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C
     
 }
 ORDER BY ?Neuron_IRI ?Region_A ?Region_B ?Region_C ?Species
-"""
\ No newline at end of file
+"""
+# Note: locations are concatenated on the server and hashed locally (see pathwaystore),
+# since the order of GROUP_CONCAT is not guaranteed
+neuron_fingerprint_query = """
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+
+SELECT ?Neuron_IRI (SAMPLE(?Neuron_Label) AS ?Neuron_Label) (GROUP_CONCAT(DISTINCT ?Location_Key; separator=" ") AS ?Locations)
+{
+    ?Neuron_IRI rdfs:label ?Neuron_Label;
+                ?Location_Type ?Location.
+
+    FILTER (?Location_Type IN (ilxtr:hasSomaLocation, ilxtr:hasAxonLocation, ilxtr:hasAxonTerminalLocation, ilxtr:hasAxonSensoryLocation, ilxtr:isObservedInSpecies))
+    BIND (CONCAT(STR(?Location_Type), "=", STR(?Location)) AS ?Location_Key)
+}
+GROUP BY ?Neuron_IRI
+ORDER BY ?Neuron_IRI
+"""
+
+# Same as neuron_path_all_species_query, restricted to the neurons in neuron_values
+# e.g. neuron_path_values_query.format(neuron_values="<http://...> <http://...>")
+neuron_path_values_query = """
+PREFIX owl: <http://www.w3.org/2002/07/owl#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX partOf: <http://purl.obolibrary.org/obo/BFO_0000050>
+PREFIX ilxtr: <http://uri.interlex.org/tgbugs/uris/readable/>
+PREFIX oboInOwl: <http://www.geneontology.org/formats/oboInOwl#> 
+
+SELECT DISTINCT ?Neuron_IRI ?Neuron_Label ?A ?Region_A ?B ?Region_B ?C ?Region_C ?Species ?Species_link
+{{
+    VALUES ?Neuron_IRI {{ {neuron_values} }}
+
+    ?Neuron_IRI rdfs:label ?Neuron_Label;
+                ilxtr:hasSomaLocation ?A;
+                ilxtr:hasAxonLocation ?C;
+                (ilxtr:hasAxonTerminalLocation | ilxtr:hasAxonSensoryLocation) ?B. 
+
+    ?Neuron_IRI ilxtr:isObservedInSpecies ?Species_link.
+
+    ?A (rdfs:label | oboInOwl:hasExactSynonym) ?Region_A.
+    ?B (rdfs:label | oboInOwl:hasExactSynonym) ?Region_B.
+    ?C (rdfs:label | oboInOwl:hasExactSynonym) ?Region_C.
+    ?Species_link (rdfs:label | oboInOwl:hasExactSynonym) ?Species.
+}}
+ORDER BY ?Neuron_IRI ?Region_A ?Region_B ?Region_C ?Species
+"""
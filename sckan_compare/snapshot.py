@@ -0,0 +1,299 @@
+"""
+Memory-mapped snapshots of the normalized pathway tables for SckanCompare package.
+
+A snapshot is produced once (e.g. by a deploy step or a cron job) and loaded
+read-only by any number of app worker processes. Each column is stored as a
+NumPy array of category codes, memory-mapped on loading, so that all workers
+share the same pages through the OS cache. The strings (IRIs and labels) are
+stored once in a single UTF-8 blob with an array of offsets; loading only
+decodes the distinct strings, never the rows.
+
+Each snapshot is written to its own subdirectory of the snapshot directory,
+and the CURRENT pointer file is then replaced atomically, so that workers
+always find a complete snapshot. The previous snapshots (up to
+globals.SNAPSHOT_KEEP in total) are kept for the workers still loading them.
+
+Layout of a snapshot directory::
+
+    CURRENT                            name of the current snapshot subdirectory
+    snapshot_<version>_<hash>/
+        meta.json                      version, content hash, creation time, and tables with their columns
+        strings.bin                    UTF-8 encoded strings, concatenated
+        string_offsets.npy             start (character) offset of each string, plus the end of the last one
+        <table>_<column>_codes.npy        category codes of each row (-1 for missing)
+        <table>_<column>_categories.npy   string index of each category
+
+Example::
+
+    python -m sckan_compare.snapshot /srv/sckan_snapshot
+
+License: Apache License 2.0
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from . import globals
+
+# version of the snapshot layout
+SNAPSHOT_FORMAT = 1
+
+# pointer file with the name of the current snapshot subdirectory
+CURRENT_FILE = "CURRENT"
+
+# prefix of the snapshot subdirectories
+SNAPSHOT_PREFIX = "snapshot_"
+
+
+def _get_codes_dtype(num_categories):
+    """
+    Get the dtype pandas uses for the codes of a categorical, so that
+    memory-mapped codes are used without conversion (i.e. without a copy).
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        if num_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _load_array(filepath, length):
+    """
+    Load an array memory-mapped read-only (empty arrays cannot be mapped).
+    """
+    return np.load(filepath, mmap_mode="r" if length else None)
+
+
+def get_snapshot_path(directory):
+    """
+    Get the path of the current snapshot of a snapshot directory.
+
+    Parameters
+    ----------
+    directory : str
+        The snapshot directory.
+
+    Returns
+    -------
+    str
+        Path of the current snapshot subdirectory.
+    """
+    with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as pointer_file:
+        return os.path.join(directory, pointer_file.read().strip())
+
+
+def _save_array(filepath, array, content_hash):
+    """
+    Save an array, and add its content to the content hash.
+    """
+    np.save(filepath, array)
+    content_hash.update(array.dtype.str.encode("ascii"))
+    content_hash.update(array.tobytes())
+
+
+def _remove_old_snapshots(directory, current, keep):
+    """
+    Remove all but the newest snapshots (and the current one) of a snapshot directory.
+    """
+    names = [name for name in os.listdir(directory)
+             if name.startswith(SNAPSHOT_PREFIX) and name != current]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    for name in names[max(keep - 1, 0):]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def write_snapshot(directory, tables, version=0):
+    """
+    Write tables as a new snapshot, replacing the current snapshot of the directory.
+
+    The snapshot is written to a subdirectory, which becomes the current
+    snapshot by an atomic replacement of the CURRENT pointer file; workers
+    keep reading the previous snapshot until they reload.
+
+    Parameters
+    ----------
+    directory : str
+        The snapshot directory.
+    tables : dict
+        Dict with table names (e.g. species) as keys and DataFrames as values.
+    version : int, optional
+        Version of the data, e.g. of the pathway store. Defaults to 0.
+
+    Returns
+    -------
+    dict
+        The snapshot metadata.
+    """
+    os.makedirs(directory, exist_ok=True)
+    temp_directory = tempfile.mkdtemp(prefix=".tmp_", dir=directory)
+    try:
+        # hash of the content, identifying snapshots of the same version with different data
+        content_hash = hashlib.sha1()
+        string_index = {}
+        meta = {"format": SNAPSHOT_FORMAT, "version": version, "tables": {}}
+        for table_idx, (name, df) in enumerate(tables.items()):
+            columns = []
+            for column_idx, column in enumerate(df.columns):
+                values = df[column]
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype("category")
+                # e.g. tables filtered by species keep the categories of all species
+                values = values.cat.remove_unused_categories()
+                categories = [string_index.setdefault(str(value), len(string_index))
+                              for value in values.cat.categories]
+                prefix = "t{}_c{}".format(table_idx, column_idx)
+                content_hash.update(json.dumps([name, column]).encode("utf-8"))
+                codes = values.cat.codes.to_numpy().astype(_get_codes_dtype(len(categories)))
+                _save_array(os.path.join(temp_directory, prefix + "_codes.npy"), codes, content_hash)
+                _save_array(os.path.join(temp_directory, prefix + "_categories.npy"),
+                            np.array(categories, dtype=np.int32), content_hash)
+                columns.append({"name": column, "file": prefix, "categories": len(categories)})
+            meta["tables"][name] = {"rows": int(df.shape[0]), "columns": columns}
+
+        offsets = np.zeros(len(string_index) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in string_index])
+        blob = "".join(string_index).encode("utf-8")
+        with open(os.path.join(temp_directory, "strings.bin"), "wb") as blob_file:
+            blob_file.write(blob)
+        content_hash.update(blob)
+        _save_array(os.path.join(temp_directory, "string_offsets.npy"), offsets, content_hash)
+        meta["strings"] = len(string_index)
+        meta["hash"] = content_hash.hexdigest()
+        meta["created"] = time.time()
+        with open(os.path.join(temp_directory, "meta.json"), "w", encoding="utf-8") as json_file:
+            json.dump(meta, json_file, indent=2)
+
+        snapshot_name = "{}{}_{}".format(SNAPSHOT_PREFIX, version, meta["hash"][:16])
+        if os.path.exists(os.path.join(directory, snapshot_name)):
+            # same version and content; the existing snapshot is made current
+            with open(os.path.join(directory, snapshot_name, "meta.json"), encoding="utf-8") as json_file:
+                meta = json.load(json_file)
+            shutil.rmtree(temp_directory)
+        else:
+            os.replace(temp_directory, os.path.join(directory, snapshot_name))
+    except BaseException:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+    pointer_filepath = os.path.join(directory, CURRENT_FILE)
+    with open(pointer_filepath + ".tmp", "w", encoding="utf-8") as pointer_file:
+        pointer_file.write(snapshot_name)
+    os.replace(pointer_filepath + ".tmp", pointer_filepath)
+    _remove_old_snapshots(directory, snapshot_name, globals.SNAPSHOT_KEEP)
+    return meta
+
+
+def read_snapshot_meta(directory):
+    """
+    Read the metadata of the current snapshot, e.g. to check for a new snapshot.
+
+    Parameters
+    ----------
+    directory : str
+        The snapshot directory.
+
+    Returns
+    -------
+    dict
+        The snapshot metadata (e.g. 'version', 'hash' and 'created').
+    """
+    return _read_current(directory, _read_meta)
+
+
+def _read_current(directory, read):
+    """
+    Read the current snapshot of a directory with a function of the snapshot path.
+    If the snapshot is removed while being read (after newer snapshots were
+    written), the then current snapshot is read instead.
+    """
+    while True:
+        path = get_snapshot_path(directory)
+        try:
+            return read(path)
+        except FileNotFoundError:
+            if get_snapshot_path(directory) == path:
+                raise
+
+
+def _read_meta(path):
+    """
+    Read and check the metadata of a snapshot subdirectory.
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as json_file:
+        meta = json.load(json_file)
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Unsupported snapshot format: {}!".format(meta.get("format")))
+    return meta
+
+
+def load_snapshot(directory):
+    """
+    Load the tables of the current snapshot, with their columns memory-mapped read-only.
+
+    Parameters
+    ----------
+    directory : str
+        The snapshot directory.
+
+    Returns
+    -------
+    tuple
+        The snapshot metadata, and dict with table names as keys and DataFrames
+        (categorical columns) as values. The DataFrames should not be modified.
+    """
+    return _read_current(directory, _load_tables)
+
+
+def _load_tables(path):
+    """
+    Load the tables of a snapshot subdirectory; all files are read from the same snapshot.
+    """
+    meta = _read_meta(path)
+    offsets = np.load(os.path.join(path, "string_offsets.npy")).tolist()
+    with open(os.path.join(path, "strings.bin"), "rb") as blob_file:
+        text = blob_file.read().decode("utf-8")
+    # distinct strings are split once, and shared by all columns
+    strings = np.empty(len(offsets) - 1, dtype=object)
+    strings[:] = [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    tables = {}
+    for name, table in meta["tables"].items():
+        columns = {}
+        for column in table["columns"]:
+            prefix = os.path.join(path, column["file"])
+            categories = np.load(prefix + "_categories.npy")
+            codes = _load_array(prefix + "_codes.npy", table["rows"])
+            dtype = pd.CategoricalDtype(pd.Index(strings[categories], dtype=object))
+            columns[column["name"]] = pd.Categorical.from_codes(codes, dtype=dtype)
+        tables[name] = pd.DataFrame(columns, index=pd.RangeIndex(table["rows"]), copy=False)
+    return meta, tables
+
+
+def main():
+    """
+    Command line entry point for writing a snapshot of all species with a visual map.
+    """
+    # imported here to avoid a circular import
+    from . import SckanCompare
+
+    parser = argparse.ArgumentParser(description="Write a memory-mapped snapshot of the SCKAN pathway tables.")
+    parser.add_argument("directory", help="snapshot directory")
+    parser.add_argument("--species", nargs="+", default=None, help="species to include (default: all with a visual map)")
+    parser.add_argument("--endpoint", default=globals.BLAZEGRAPH_ENDPOINT, help="SPARQL endpoint URL")
+    args = parser.parse_args()
+
+    sc = SckanCompare(endpoint=args.endpoint)
+    sc.refresh_pathway_store()
+    meta = sc.save_snapshot(args.directory, species_list=args.species)
+    print("Snapshot version {} written to {}".format(meta["version"], args.directory))
+
+
+if __name__ == "__main__":
+    main()
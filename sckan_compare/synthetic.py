@@ -0,0 +1,645 @@
+"""
+Synthetic SCKAN data for scale testing SckanCompare package.
+
+Generates query results with the exact columns (and row multiplicity) of the
+queries in `query`, for a configurable number of neurons, regions, species
+and synonyms per term. Regions are taken from the species coordinate maps,
+so that the normalized tables can be plotted like the real data; regions
+beyond those of a map get synthetic IRIs and are dropped on normalization,
+like the regions of the real data that are not available in a visual map.
+
+The same object answers all queries used by the package, so that every
+stage (caching, pathway store, normalization, visualization) can be run at
+any scale without the data source::
+
+    from sckan_compare import SckanCompare, query, synthetic
+
+    data = synthetic.SyntheticSckan(num_neurons=20000, synonyms_per_term=2)
+    query.sparql_query = data.sparql_query
+    sc = SckanCompare(endpoint="synthetic")
+
+or as a local stand-in SPARQL endpoint, e.g. for the web app::
+
+    python -m sckan_compare.synthetic --port 8890 --neurons 20000
+
+License: Apache License 2.0
+"""
+
+import io
+import re
+import csv
+import random
+import argparse
+import threading
+import http.server
+import urllib.parse
+
+from . import globals
+from . import query
+from . import coordmap
+
+# IRIs of the species with a visual map
+SPECIES_IRIS = {
+    "Homo sapiens": "http://purl.obolibrary.org/obo/NCBITaxon_9606",
+    "Mus musculus": "http://purl.obolibrary.org/obo/NCBITaxon_10090",
+    "Rattus norvegicus": "http://purl.obolibrary.org/obo/NCBITaxon_10116",
+}
+
+# namespace of the IRIs of all synthetic terms
+SYNTHETIC_NAMESPACE = "http://example.org/sckan-synthetic/"
+
+# location types of the neurons, as in `query.neuron_fingerprint_query`
+ILXTR = "http://uri.interlex.org/tgbugs/uris/readable/"
+
+PATH_HEADER = ["Neuron_IRI", "Neuron_Label", "A", "Region_A", "B", "Region_B",
+               "C", "Region_C", "Species", "Species_link"]
+
+PHENOTYPE_PATH_HEADER = PATH_HEADER + ["Phenotype_link", "Phenotype"]
+
+
+class SyntheticSckan(object):
+    """
+    A class generating synthetic but realistic SCKAN query results.
+
+    Each neuron has one soma location (A), one or more terminal locations (B)
+    and axon locations (C), is observed in one or more species, and has a
+    neuronal phenotype and a circuit role. As in the data source, every term
+    has a label and `synonyms_per_term` exact synonyms, and the path queries
+    return one row per combination of labels.
+
+    Parameters
+    ----------
+    num_neurons : int, optional
+        Number of neurons. Defaults to 200.
+    num_species : int, optional
+        Number of species; the species with a visual map come first,
+        additional species are synthetic. Defaults to 5.
+    num_regions : int, optional
+        Number of regions per species; defaults to the regions of the species
+        map. Regions beyond those of the map get synthetic IRIs.
+    synonyms_per_term : int, optional
+        Number of exact synonyms of each region, species and phenotype. Defaults to 1.
+    max_terminal_locations : int, optional
+        Maximum number of terminal locations (B) per neuron. Defaults to 2.
+    max_axon_locations : int, optional
+        Maximum number of axon locations (C) per neuron. Defaults to 4.
+    max_species_per_neuron : int, optional
+        Maximum number of species a neuron is observed in. Defaults to 2.
+    num_phenotypes : int, optional
+        Number of neuronal phenotypes. Defaults to 6.
+    num_circuit_roles : int, optional
+        Number of circuit roles. Defaults to 4.
+    connection_probability : float, optional
+        Probability of a neuron having a forward connection. Defaults to 0.3.
+    seed : int, optional
+        Seed of the random generator; equal parameters give equal data. Defaults to 0.
+
+    Attributes
+    ----------
+    species : list
+        List of (IRI, label) tuples of the species.
+    regions : dict
+        Dict with species labels as keys and lists of (IRI, label) tuples as values.
+    neurons : list
+        List of dicts with the IRI, label, locations, species, phenotype and
+        circuit role of each neuron, sorted by IRI.
+    synonyms : dict
+        Dict with term IRIs as keys and lists of labels (label first) as values.
+
+    Methods
+    -------
+    __init__(num_neurons=200, num_species=5, num_regions=None, synonyms_per_term=1, ...):
+        Initialize the SyntheticSckan class.
+    iter_path_rows(species=None, phenotype=None, neuron_iris=None):
+        Iterate over the rows of a path query.
+    get_path_result(species=None, phenotype=None, neuron_iris=None):
+        Get the result of a path query.
+    get_species_result(synonyms=False):
+        Get the result of a species query.
+    get_region_result(species=None, synonyms=False, region=None):
+        Get the result of a region query.
+    get_phenotype_result(circuit_role=False, species=None):
+        Get the result of a phenotype query.
+    get_phenotype_pairs_result(circuit_role=False):
+        Get the result of a neuron to phenotype pairs query.
+    get_forward_connection_result():
+        Get the result of the forward connection query.
+    get_fingerprint_result():
+        Get the result of the fingerprint query.
+    sparql_query(query_string, endpoint=None):
+        Answer a query of the `query` module.
+    write_csv(result, filepath):
+        Write a query result to a CSV file.
+    """
+
+    def __init__(self, num_neurons=200, num_species=5, num_regions=None, synonyms_per_term=1,
+                 max_terminal_locations=2, max_axon_locations=4, max_species_per_neuron=2,
+                 num_phenotypes=6, num_circuit_roles=4, connection_probability=0.3, seed=0):
+        """
+        Initialize SyntheticSckan object.
+
+        Parameters
+        ----------
+        num_neurons : int, optional
+            Number of neurons.
+        num_species : int, optional
+            Number of species.
+        num_regions : int, optional
+            Number of regions per species; defaults to the regions of the species map.
+        synonyms_per_term : int, optional
+            Number of exact synonyms of each region, species and phenotype.
+        max_terminal_locations : int, optional
+            Maximum number of terminal locations (B) per neuron.
+        max_axon_locations : int, optional
+            Maximum number of axon locations (C) per neuron.
+        max_species_per_neuron : int, optional
+            Maximum number of species a neuron is observed in.
+        num_phenotypes : int, optional
+            Number of neuronal phenotypes.
+        num_circuit_roles : int, optional
+            Number of circuit roles.
+        connection_probability : float, optional
+            Probability of a neuron having a forward connection.
+        seed : int, optional
+            Seed of the random generator.
+        """
+        if num_neurons < 1:
+            raise ValueError("num_neurons needs to be specified!")
+        if num_species < 1:
+            raise ValueError("num_species needs to be specified!")
+        self.synonyms_per_term = synonyms_per_term
+        self.synonyms = {}
+        rng = random.Random(seed)
+
+        # species with a visual map first, then synthetic species
+        self.species = []
+        for label in list(globals.AVAILABLE_SPECIES_MAPS.keys())[:num_species]:
+            self.species.append((SPECIES_IRIS[label], label))
+        for idx in range(num_species - len(self.species)):
+            self.species.append((SYNTHETIC_NAMESPACE + "species/{}".format(idx), "Synthetic species {}".format(idx)))
+        for iri, label in self.species:
+            self._add_term(iri, label)
+
+        # regions of each species; synthetic species use the regions of all maps
+        all_map_regions = {}
+        for label in globals.AVAILABLE_SPECIES_MAPS.keys():
+            region_map = coordmap.get_coordinate_map(label)
+            all_map_regions.update(zip(region_map.urls, region_map.names))
+        self.regions = {}
+        num_extra = 0
+        for _, label in self.species:
+            if label in globals.AVAILABLE_SPECIES_MAPS:
+                region_map = coordmap.get_coordinate_map(label)
+                regions = list(dict(zip(region_map.urls, region_map.names)).items())
+            else:
+                regions = list(all_map_regions.items())
+            if num_regions is not None and num_regions < len(regions):
+                regions = rng.sample(regions, num_regions)
+            elif num_regions is not None:
+                for _ in range(num_regions - len(regions)):
+                    regions.append((SYNTHETIC_NAMESPACE + "region/{}".format(num_extra),
+                                    "synthetic region {}".format(num_extra)))
+                    num_extra += 1
+            self.regions[label] = regions
+            for iri, region in regions:
+                self._add_term(iri, region)
+
+        self.phenotypes = [(SYNTHETIC_NAMESPACE + "phenotype/{}".format(idx), "synthetic phenotype {}".format(idx))
+                           for idx in range(num_phenotypes)]
+        self.circuit_roles = [(SYNTHETIC_NAMESPACE + "circuit-role/{}".format(idx), "synthetic circuit role {}".format(idx))
+                              for idx in range(num_circuit_roles)]
+        for iri, label in self.phenotypes + self.circuit_roles:
+            self._add_term(iri, label)
+
+        # neurons, numbered with a fixed width so that they are sorted by IRI
+        width = len(str(num_neurons - 1))
+        self.neurons = []
+        for idx in range(num_neurons):
+            species = rng.sample(self.species, rng.randint(1, min(max_species_per_neuron, len(self.species))))
+            # locations are drawn from the regions of the first species of the neuron
+            regions = self.regions[species[0][1]]
+            num_terminal = rng.randint(1, max_terminal_locations)
+            num_axon = rng.randint(1, max_axon_locations)
+            locations = rng.sample(regions, min(1 + num_terminal + num_axon, len(regions)))
+            self.neurons.append({
+                "iri": SYNTHETIC_NAMESPACE + "neuron/{:0{}d}".format(idx, width),
+                "label": "synthetic neuron {}".format(idx),
+                "A": locations[:1],
+                "B": locations[1:1 + num_terminal] or locations[:1],
+                "C": locations[1 + num_terminal:] or locations[1:2] or locations[:1],
+                "species": sorted(iri for iri, _ in species),
+                "phenotype": rng.choice(self.phenotypes)[0] if self.phenotypes else None,
+                "circuit_role": rng.choice(self.circuit_roles)[0] if self.circuit_roles else None,
+            })
+        self.connections = []
+        for idx, neuron in enumerate(self.neurons):
+            if num_neurons > 1 and rng.random() < connection_probability:
+                # any other neuron
+                target = (idx + rng.randrange(1, num_neurons)) % num_neurons
+                self.connections.append((neuron["iri"], self.neurons[target]["iri"]))
+        self.connections.sort()
+
+        self._responses = None
+
+    def _add_term(self, iri, label):
+        """
+        Add a term with its label and synonyms.
+        """
+        if iri not in self.synonyms:
+            self.synonyms[iri] = [label] + ["{} synonym {}".format(label, idx + 1)
+                                            for idx in range(self.synonyms_per_term)]
+
+    def _get_species_iri(self, species):
+        """
+        Get the IRI of a species from its label.
+        """
+        for iri, label in self.species:
+            if label == species:
+                return iri
+        raise ValueError("Invalid species specified!")
+
+    def iter_path_rows(self, species=None, phenotype=None, neuron_iris=None):
+        """
+        Iterate over the rows of a path query, without holding them in memory.
+
+        Parameters
+        ----------
+        species : str, optional
+            Species label; only the rows with this label as Species are returned,
+            as by the queries filtering on species. Defaults to all species.
+        phenotype : str, optional
+            'phenotype' or 'circuit_role' for the columns of the phenotype and
+            circuit role path queries. Defaults to None.
+        neuron_iris : set, optional
+            Only return the rows of these neurons. Defaults to all neurons.
+
+        Yields
+        ------
+        list
+            The rows, in the order of the neurons.
+        """
+        if phenotype not in (None, "phenotype", "circuit_role"):
+            raise ValueError("Invalid phenotype specified!")
+        species_iri = self._get_species_iri(species) if species else None
+        for neuron in self.neurons:
+            if neuron_iris is not None and neuron["iri"] not in neuron_iris:
+                continue
+            if species_iri is not None and species_iri not in neuron["species"]:
+                continue
+            extra = [[]]
+            if phenotype is not None:
+                phenotype_iri = neuron["phenotype" if phenotype == "phenotype" else "circuit_role"]
+                if phenotype_iri is None:
+                    continue
+                extra = [[phenotype_iri, label] for label in self.synonyms[phenotype_iri]]
+            species_columns = [[label, iri] for iri in neuron["species"] for label in self.synonyms[iri]
+                               if species_iri is None or (iri == species_iri and label == species)]
+            for a, _ in neuron["A"]:
+                for region_a in self.synonyms[a]:
+                    for b, _ in neuron["B"]:
+                        for region_b in self.synonyms[b]:
+                            for c, _ in neuron["C"]:
+                                for region_c in self.synonyms[c]:
+                                    start = [neuron["iri"], neuron["label"], a, region_a, b, region_b, c, region_c]
+                                    for species_column in species_columns:
+                                        for extra_column in extra:
+                                            yield start + species_column + extra_column
+
+    def get_path_result(self, species=None, phenotype=None, neuron_iris=None):
+        """
+        Get the result of a path query (e.g. `query.neuron_path_all_species_query`).
+
+        Parameters
+        ----------
+        species : str, optional
+            Species label, for the queries filtering on species. Defaults to all species.
+        phenotype : str, optional
+            'phenotype' or 'circuit_role' for the columns of the phenotype and
+            circuit role path queries. Defaults to None.
+        neuron_iris : set, optional
+            Only return the rows of these neurons. Defaults to all neurons.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        header = PATH_HEADER if phenotype is None else PHENOTYPE_PATH_HEADER
+        return [list(header)] + list(self.iter_path_rows(species, phenotype, neuron_iris))
+
+    def get_species_result(self, synonyms=False):
+        """
+        Get the result of a species query (e.g. `query.species_without_synonyms_query`).
+
+        Parameters
+        ----------
+        synonyms : bool, optional
+            Whether to include the synonyms. Defaults to False.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        result = [["Species_link", "Species"]]
+        for iri, _ in sorted(self.species):
+            labels = self.synonyms[iri] if synonyms else self.synonyms[iri][:1]
+            result.extend([iri, label] for label in sorted(labels))
+        return result
+
+    def get_region_result(self, species=None, synonyms=False, region=None):
+        """
+        Get the result of a region query (e.g. `query.combined_regions_specify_species_without_synonyms_query`).
+
+        Parameters
+        ----------
+        species : str, optional
+            Species label. Defaults to all species.
+        synonyms : bool, optional
+            Whether to include the synonyms. Defaults to False.
+        region : str, optional
+            A, B or C for the queries of a single location type, with the
+            columns 'Species_link' and 'Region_A' (or B, C). Defaults to None.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        if region not in (None, "A", "B", "C"):
+            raise ValueError("Invalid region specified!")
+        species_iri = self._get_species_iri(species) if species else None
+        # as in the queries, B includes the axon locations
+        location_types = {None: ("A", "B", "C"), "A": ("A",), "B": ("B", "C"), "C": ("C",)}[region]
+        found = set()
+        for neuron in self.neurons:
+            if species_iri is not None and species_iri not in neuron["species"]:
+                continue
+            for location_type in location_types:
+                for iri, _ in neuron[location_type]:
+                    if region is None:
+                        found.add((iri,))
+                    else:
+                        found.update((species_link, iri) for species_link in neuron["species"]
+                                     if species_iri is None or species_link == species_iri)
+
+        if region is None:
+            result = [["Region_URI", "Region"]]
+            for (iri,) in sorted(found):
+                labels = self.synonyms[iri] if synonyms else self.synonyms[iri][:1]
+                result.extend([iri, label] for label in sorted(labels))
+        else:
+            result = [["Species_link", "Region_" + region]]
+            for species_link, iri in sorted(found):
+                result.extend([species_link, label] for label in sorted(self.synonyms[iri]))
+        return result
+
+    def get_phenotype_result(self, circuit_role=False, species=None):
+        """
+        Get the result of a phenotype query (e.g. `query.combined_phenotypes_all_species_query`).
+
+        Parameters
+        ----------
+        circuit_role : bool, optional
+            Whether to get the circuit roles instead of the neuronal phenotypes. Defaults to False.
+        species : str, optional
+            Species label. Defaults to all species.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        species_iri = self._get_species_iri(species) if species else None
+        key = "circuit_role" if circuit_role else "phenotype"
+        found = {neuron[key] for neuron in self.neurons
+                 if neuron[key] is not None and (species_iri is None or species_iri in neuron["species"])}
+        result = [["Phenotype_link", "Phenotype"]]
+        for iri in sorted(found):
+            result.extend([iri, label] for label in sorted(self.synonyms[iri]))
+        return result
+
+    def get_phenotype_pairs_result(self, circuit_role=False):
+        """
+        Get the result of a neuron to phenotype pairs query (e.g. `query.neuron_phenotype_pairs_query`).
+
+        Parameters
+        ----------
+        circuit_role : bool, optional
+            Whether to get the circuit roles instead of the neuronal phenotypes. Defaults to False.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        key = "circuit_role" if circuit_role else "phenotype"
+        return [["Neuron_IRI", "Phenotype_link"]] + [[neuron["iri"], neuron[key]] for neuron in self.neurons
+                                                       if neuron[key] is not None]
+
+    def get_forward_connection_result(self):
+        """
+        Get the result of `query.neuron_forward_connection_query`.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        return [["Neuron_1_IRI", "Neuron_2_IRI"]] + [list(connection) for connection in self.connections]
+
+    def get_fingerprint_result(self):
+        """
+        Get the result of `query.neuron_fingerprint_query`.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+        """
+        result = [["Neuron_IRI", "Neuron_Label", "Locations"]]
+        for neuron in self.neurons:
+            keys = ["{}hasSomaLocation={}".format(ILXTR, iri) for iri, _ in neuron["A"]]
+            keys += ["{}hasAxonTerminalLocation={}".format(ILXTR, iri) for iri, _ in neuron["B"]]
+            keys += ["{}hasAxonLocation={}".format(ILXTR, iri) for iri, _ in neuron["C"]]
+            keys += ["{}isObservedInSpecies={}".format(ILXTR, iri) for iri in neuron["species"]]
+            result.append([neuron["iri"], neuron["label"], " ".join(keys)])
+        return result
+
+    def _get_responses(self):
+        """
+        Get a dict with the query strings of the `query` module as keys, and
+        functions returning their result as values.
+        """
+        responses = {
+            query.species_without_synonyms_query: lambda: self.get_species_result(),
+            query.species_with_synonyms_query: lambda: self.get_species_result(synonyms=True),
+            query.combined_regions_all_species_without_synonyms_query:
+                lambda: self.get_region_result(),
+            query.combined_regions_all_species_with_synonyms_query:
+                lambda: self.get_region_result(synonyms=True),
+            query.combined_phenotypes_all_species_query: lambda: self.get_phenotype_result(),
+            query.combined_circuit_role_phenotypes_all_species_query:
+                lambda: self.get_phenotype_result(circuit_role=True),
+            query.neuron_path_all_species_query: lambda: self.get_path_result(),
+            query.app_query: lambda: self.get_path_result(),
+            query.neuron_path_phenotype_all_species_query: lambda: self.get_path_result(phenotype="phenotype"),
+            query.neuron_circuit_role_all_species_query: lambda: self.get_path_result(phenotype="circuit_role"),
+            query.neuron_phenotype_pairs_query: lambda: self.get_phenotype_pairs_result(),
+            query.neuron_circuit_role_pairs_query: lambda: self.get_phenotype_pairs_result(circuit_role=True),
+            query.neuron_forward_connection_query: lambda: self.get_forward_connection_result(),
+            query.neuron_fingerprint_query: lambda: self.get_fingerprint_result(),
+        }
+        for _, label in self.species:
+            # default arguments bind the current species
+            species_queries = {
+                query.regionsA_specify_species_with_synonyms_query:
+                    lambda species=label: self.get_region_result(species, region="A"),
+                query.regionsB_specify_species_with_synonyms_query:
+                    lambda species=label: self.get_region_result(species, region="B"),
+                query.regionsC_specify_species_with_synonyms_query:
+                    lambda species=label: self.get_region_result(species, region="C"),
+                query.combined_regions_specify_species_without_synonyms_query:
+                    lambda species=label: self.get_region_result(species),
+                query.combined_regions_specify_species_with_synonyms_query:
+                    lambda species=label: self.get_region_result(species, synonyms=True),
+                query.combined_phenotypes_specify_species_query:
+                    lambda species=label: self.get_phenotype_result(species=species),
+                query.combined_circuit_role_phenotypes_specify_species_query:
+                    lambda species=label: self.get_phenotype_result(circuit_role=True, species=species),
+                query.neuron_path_query: lambda species=label: self.get_path_result(species),
+                query.example_query_specify_species: lambda species=label: self.get_path_result(species),
+                query.neuron_path_phenotype_query:
+                    lambda species=label: self.get_path_result(species, phenotype="phenotype"),
+                query.neuron_circuit_role_query:
+                    lambda species=label: self.get_path_result(species, phenotype="circuit_role"),
+            }
+            for query_string, response in species_queries.items():
+                responses[query_string.format(species_param=label)] = response
+        return responses
+
+    def sparql_query(self, query_string, endpoint=None, **kwargs):
+        """
+        Answer a query of the `query` module, like `query.sparql_query`.
+
+        Parameters
+        ----------
+        query_string : str
+            The query string, with the species filled in if applicable.
+        endpoint : str, optional
+            Ignored; for compatibility with `query.sparql_query`.
+
+        Returns
+        -------
+        list
+            The query result, with the header as first row.
+
+        Raises
+        ------
+        ValueError
+            If the query is not supported.
+        """
+        if self._responses is None:
+            self._responses = self._get_responses()
+        if query_string in self._responses:
+            return self._responses[query_string]()
+        if "VALUES ?Neuron_IRI" in query_string:
+            neuron_iris = set(re.findall(r"<([^>]+)>", query_string.split("VALUES ?Neuron_IRI", 1)[1].split("}")[0]))
+            return self.get_path_result(neuron_iris=neuron_iris)
+        raise ValueError("Query not supported by synthetic data!")
+
+    def write_csv(self, result, filepath):
+        """
+        Write a query result to a CSV file, as returned by the data source.
+
+        Parameters
+        ----------
+        result : list or iterator
+            The query result, with the header as first row (e.g. from
+            `get_path_result`, or a header followed by `iter_path_rows`).
+        filepath : str
+            Path of the CSV file.
+        """
+        with open(filepath, "w", newline="", encoding="utf-8") as csv_file:
+            csv.writer(csv_file).writerows(result)
+
+
+def serve(data, host="127.0.0.1", port=0):
+    """
+    Serve synthetic data as a local stand-in SPARQL endpoint, in a background thread.
+
+    Query results are returned as CSV, as by the data source; each distinct
+    result is rendered only once, so that the endpoint adds little load to
+    benchmarks and load tests running on the same host.
+
+    Parameters
+    ----------
+    data : SyntheticSckan
+        The synthetic data.
+    host : str, optional
+        Host to listen on. Defaults to '127.0.0.1'.
+    port : int, optional
+        Port to listen on; defaults to 0 (any free port).
+
+    Returns
+    -------
+    tuple
+        The server (see `shutdown()` and `server_close()`) and the endpoint URL.
+    """
+    bodies = {}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            query_string = params.get("query", [""])[0]
+            if query_string not in bodies:
+                try:
+                    result = data.sparql_query(query_string)
+                except ValueError as error:
+                    self.send_error(400, str(error))
+                    return
+                text = io.StringIO()
+                csv.writer(text).writerows(result)
+                bodies[query_string] = text.getvalue().encode("utf-8")
+            body = bodies[query_string]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="sckan-compare-synthetic-endpoint", daemon=True).start()
+    return server, "http://{}:{}/sparql".format(host, server.server_address[1])
+
+
+def main():
+    """
+    Command line entry point for running a stand-in SPARQL endpoint with synthetic data.
+    """
+    parser = argparse.ArgumentParser(description="Serve synthetic SCKAN data as a local SPARQL endpoint.")
+    parser.add_argument("--host", default="127.0.0.1", help="host to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8890, help="port to listen on (default: 8890)")
+    parser.add_argument("--neurons", type=int, default=200, help="number of neurons (default: 200)")
+    parser.add_argument("--species", type=int, default=5, help="number of species (default: 5)")
+    parser.add_argument("--synonyms", type=int, default=1, help="number of synonyms per term (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: 0)")
+    args = parser.parse_args()
+
+    data = SyntheticSckan(num_neurons=args.neurons, num_species=args.species,
+                          synonyms_per_term=args.synonyms, seed=args.seed)
+    server, endpoint = serve(data, host=args.host, port=args.port)
+    print("Serving synthetic data at {}".format(endpoint))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
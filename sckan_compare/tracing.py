@@ -0,0 +1,196 @@
+"""
+Tracing of processing stages for SckanCompare package.
+
+Stages (e.g. the SPARQL request, CSV parsing, cache lookups, DataFrame
+construction and figure building) are wrapped in spans that record their
+duration and attributes such as row counts, bytes transferred or cache hits.
+Finished spans are aggregated into in-process statistics, and can be passed
+to user-defined hooks, e.g. for logging or exporting to a monitoring system.
+
+Example::
+
+    from sckan_compare import tracing
+    tracing.add_hook(lambda span: print(span.name, span.duration, span.attributes))
+    ...
+    tracing.get_stats()
+
+License: Apache License 2.0
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+# whether spans are recorded; set to False to disable tracing
+enabled = True
+
+# events for which hooks can be registered
+HOOK_EVENTS = ("start", "end")
+
+_hooks = {event: [] for event in HOOK_EVENTS}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class Span(object):
+    """
+    A class representing a single traced stage.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    attributes : dict, optional
+        Attributes of the stage.
+
+    Attributes
+    ----------
+    name : str
+        Name of the stage.
+    attributes : dict
+        Attributes of the stage, e.g. 'rows', 'bytes' or 'cache_hit'.
+    start_time : float
+        Start time (from time.perf_counter()).
+    duration : float
+        Duration in seconds; None while the stage is running.
+
+    Methods
+    -------
+    __init__(name, attributes=None):
+        Initialize the Span class.
+    set(**attributes):
+        Set attributes of the span.
+    """
+
+    def __init__(self, name, attributes=None):
+        """
+        Initialize Span object.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        attributes : dict, optional
+            Attributes of the stage.
+        """
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_time = None
+        self.duration = None
+
+    def set(self, **attributes):
+        """
+        Set attributes of the span.
+
+        Parameters
+        ----------
+        **attributes
+            Attributes to be set, e.g. rows=10.
+        """
+        self.attributes.update(attributes)
+
+
+def add_hook(hook, event="end"):
+    """
+    Register a hook to be called with each span.
+
+    Parameters
+    ----------
+    hook : callable
+        Function accepting a Span as its only argument.
+    event : str, optional
+        When to call the hook: 'start' or 'end' of the span. Defaults to 'end'.
+    """
+    if event not in HOOK_EVENTS:
+        raise ValueError("Invalid event specified: {}!".format(event))
+    _hooks[event].append(hook)
+
+
+def remove_hook(hook, event="end"):
+    """
+    Remove a registered hook.
+
+    Parameters
+    ----------
+    hook : callable
+        The hook to be removed.
+    event : str, optional
+        The event the hook was registered for. Defaults to 'end'.
+    """
+    if event not in HOOK_EVENTS:
+        raise ValueError("Invalid event specified: {}!".format(event))
+    _hooks[event].remove(hook)
+
+
+def _record(span):
+    """
+    Add a finished span to the in-process statistics.
+    """
+    with _stats_lock:
+        stats = _stats.setdefault(span.name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["total_seconds"] += span.duration
+        stats["max_seconds"] = max(stats["max_seconds"], span.duration)
+        # numeric attributes are summed (booleans are counted, e.g. cache hits)
+        for key, value in span.attributes.items():
+            if isinstance(value, (int, float)):
+                stats[key] = stats.get(key, 0) + value
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Trace a stage within a context.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    **attributes
+        Initial attributes of the span.
+
+    Yields
+    ------
+    Span
+        The span, to which further attributes can be added via `set()`.
+    """
+    current = Span(name, attributes)
+    if not enabled:
+        yield current
+        return
+    for hook in _hooks["start"]:
+        hook(current)
+    current.start_time = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start_time
+        _record(current)
+        for hook in _hooks["end"]:
+            hook(current)
+
+
+def get_stats():
+    """
+    Get the statistics of all spans recorded so far.
+
+    Returns
+    -------
+    dict
+        Dict with stage names as keys and dicts as values, containing the
+        number of spans ('count'), their total, mean and maximum duration
+        in seconds, and the sums of their numeric attributes.
+    """
+    with _stats_lock:
+        stats = {name: dict(values) for name, values in _stats.items()}
+    for values in stats.values():
+        values["mean_seconds"] = values["total_seconds"] / values["count"]
+    return stats
+
+
+def reset_stats():
+    """
+    Clear the statistics of all spans recorded so far.
+    """
+    with _stats_lock:
+        _stats.clear()
@@ -4,11 +4,14 @@ Utility methods for SckanCompare package.
 License: Apache License 2.0
 """
 
+import sys
+import numpy as np
 import pandas as pd
 from . import globals
+from . import tracing
 
 
-def get_dataframe(data_as_list):
+def get_dataframe(data_as_list, categorical=False, intern_table=None):
     """
     Convert a list of data to a pandas DataFrame.
 
@@ -16,19 +19,127 @@ def get_dataframe(data_as_list):
     ----------
     data_as_list : list
         List of data to be converted.
+    categorical : bool, optional
+        Whether to create dictionary-encoded (categorical) columns. Defaults to False.
+    intern_table : dict, optional
+        Intern table to share the category strings with other tables.
+        Only used with categorical columns.
 
     Returns
     -------
     pandas.DataFrame
         The converted DataFrame.
     """
-    # convert data_as_list to pandas dataframe
-    df = pd.DataFrame(data_as_list)
-    #set column names equal to values in row index position 0
-    df.columns = df.iloc[0]
-    #remove first row from DataFrame
-    df = df[1:]
-    return df
+    with tracing.span("get_dataframe", rows=max(len(data_as_list) - 1, 0)):
+        if not categorical:
+            # convert data_as_list to pandas dataframe
+            df = pd.DataFrame(data_as_list)
+            #set column names equal to values in row index position 0
+            df.columns = df.iloc[0]
+            #remove first row from DataFrame
+            df = df[1:]
+            return df
+
+        # build each column directly as categorical, avoiding an object-dtype copy
+        columns = {}
+        rows = data_as_list[1:]
+        for idx, name in enumerate(data_as_list[0]):
+            column = pd.Categorical([row[idx] for row in rows])
+            if intern_table is not None:
+                column = column.rename_categories(intern_strings(column.categories, intern_table))
+            columns[name] = column
+        # index starts at 1, as for the non-categorical DataFrame
+        return pd.DataFrame(columns, index=pd.RangeIndex(1, len(data_as_list)))
+
+def intern_strings(values, intern_table):
+    """
+    Replace strings by their shared instance in an intern table.
+
+    Parameters
+    ----------
+    values : iterable
+        The strings to be interned.
+    intern_table : dict
+        Dict mapping each string to its shared instance; updated with new strings.
+
+    Returns
+    -------
+    list
+        List of the interned strings.
+    """
+    return [intern_table.setdefault(value, value) for value in values]
+
+def intern_rows(data_as_list, intern_table):
+    """
+    Intern all strings of a query result, so that repeated values
+    (e.g. IRIs) are stored only once in memory.
+
+    Parameters
+    ----------
+    data_as_list : list
+        The query result, as list of rows.
+    intern_table : dict
+        Dict mapping each string to its shared instance; updated with new strings.
+
+    Returns
+    -------
+    list
+        The query result with interned strings.
+    """
+    return [intern_strings(row, intern_table) for row in data_as_list]
+
+def map_categories(column, mapping):
+    """
+    Map the values of a column, e.g. IRIs to labels.
+
+    For a categorical column, only the categories are mapped, rather than
+    every row, and the result stays categorical; categories mapped to the
+    same value (e.g. synonyms) are merged.
+
+    Parameters
+    ----------
+    column : pandas.Series
+        The column to be mapped.
+    mapping : dict
+        Dict with the values to be mapped as keys; other values become NaN.
+
+    Returns
+    -------
+    pandas.Series or pandas.Categorical
+        The mapped column.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.map(mapping)
+    # code of the mapped value of each category (-1 for NaN), and -1 for missing values
+    label_codes, labels = pd.factorize(column.cat.categories.map(mapping))
+    codes = np.append(label_codes, -1)[column.cat.codes.to_numpy()]
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+def get_memory_usage(data):
+    """
+    Get the memory used by a DataFrame or a query result.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame or list
+        The DataFrame, or query result as list of rows.
+
+    Returns
+    -------
+    int
+        Memory usage in bytes, including the contained strings.
+        Strings shared between cells are counted once.
+    """
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(deep=True).sum())
+    total = sys.getsizeof(data)
+    strings = {}
+    for row in data:
+        total += sys.getsizeof(row)
+        for value in row:
+            strings[id(value)] = value
+    total += sum(sys.getsizeof(value) for value in strings.values())
+    return total
 
 def filter_dataframe(df, column, value):
     """
@@ -0,0 +1,32 @@
+"""
+Tests of the batch species comparison jobs, on synthetic data.
+
+License: Apache License 2.0
+"""
+
+import pytest
+
+from sckan_compare import SckanCompare, query, batch, synthetic
+
+
+@pytest.fixture
+def sc(tmp_path, monkeypatch):
+    data = synthetic.SyntheticSckan(num_neurons=300, seed=1)
+    monkeypatch.setattr(query, "sparql_query", data.sparql_query)
+    sc = SckanCompare(endpoint="synthetic", cache_directory=str(tmp_path))
+    yield sc
+    sc.cache_manager.cache.close()
+
+
+def test_species_tables_differ(sc):
+    result = sc.execute_query(query.neuron_path_all_species_query)
+    species_list = ["Homo sapiens", "Mus musculus"]
+    tables = batch.get_species_tables(sc, result, species_list)
+
+    for species in species_list:
+        assert not tables[species].empty
+        assert set(tables[species]["Species"].astype(str)) == {species}
+    assert not tables["Homo sapiens"]["Neuron_IRI"].equals(tables["Mus musculus"]["Neuron_IRI"])
+
+    df_compare = batch.compare_species_tables(tables["Homo sapiens"], tables["Mus musculus"])
+    assert (df_compare["Neurons_1"] != df_compare["Neurons_2"]).any()